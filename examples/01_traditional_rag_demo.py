@@ -7,29 +7,27 @@ This demonstrates the traditional RAG approach:
 3. Reranking → Top N documents
 4. LLM Generation → Answer
 """
+import os
 import sys
 from pathlib import Path
 
 # Add src to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from src.vector_store import VectorStore, build_vector_store
+from examples._shared import get_vector_store
 from src.rag.traditional_rag import TraditionalRAG
 
+INTERACTIVE = os.getenv("INTERACTIVE", "0") == "1"
+
 def main():
     print("="*70)
     print("TRADITIONAL RAG DEMO")
     print("="*70)
 
-    # Build/load vector store
+    # Build/load vector store (loading started when _shared was imported)
     print("\nInitializing vector store...")
-    vector_store = VectorStore()
-
-    if vector_store.count() == 0:
-        print("Building vector store from knowledge base...")
-        vector_store = build_vector_store()
-    else:
-        print(f"Vector store loaded: {vector_store.count()} documents")
+    vector_store = get_vector_store()
+    print(f"Vector store loaded: {vector_store.count()} documents")
 
     # Initialize Traditional RAG
     print("\nInitializing Traditional RAG pipeline...")
@@ -83,8 +81,8 @@ def main():
         for j, source in enumerate(result['sources'], 1):
             print(f"   [{j}] {source['metadata']['type']}: {source['metadata'].get('title', source['metadata'].get('name', 'N/A'))}")
 
-        # Wait for user
-        if i < len(test_queries):
+        # Wait for user (set INTERACTIVE=1 to pause between queries)
+        if INTERACTIVE and i < len(test_queries):
             input("\n⏎ Press Enter to continue to next query...")
 
     print(f"\n{'='*70}")
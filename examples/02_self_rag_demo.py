@@ -8,29 +8,27 @@ This demonstrates Self RAG with:
 4. Self-evaluation (quality checking)
 5. Adaptive improvement (regenerate/retrieve more)
 """
+import os
 import sys
 from pathlib import Path
 
 # Add src to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from src.vector_store import VectorStore, build_vector_store
+from examples._shared import get_vector_store
 from src.rag.self_rag import SelfRAG
 
+INTERACTIVE = os.getenv("INTERACTIVE", "0") == "1"
+
 def main():
     print("="*70)
     print("SELF RAG DEMO")
     print("="*70)
 
-    # Build/load vector store
+    # Build/load vector store (loading started when _shared was imported)
     print("\nInitializing vector store...")
-    vector_store = VectorStore()
-
-    if vector_store.count() == 0:
-        print("Building vector store from knowledge base...")
-        vector_store = build_vector_store()
-    else:
-        print(f"Vector store loaded: {vector_store.count()} documents")
+    vector_store = get_vector_store()
+    print(f"Vector store loaded: {vector_store.count()} documents")
 
     # Initialize Self RAG
     print("\nInitializing Self RAG pipeline...")
@@ -99,8 +97,8 @@ def main():
             if 'iteration' in trace:
                 print(f"   Iteration {trace['iteration']}: {trace['evaluation']['overall_quality']} → {trace['evaluation']['recommendation']}")
 
-        # Wait for user
-        if i < len(test_queries):
+        # Wait for user (set INTERACTIVE=1 to pause between queries)
+        if INTERACTIVE and i < len(test_queries):
             input("\n⏎ Press Enter to continue to next query...")
 
     print(f"\n{'='*70}")
@@ -10,29 +10,28 @@ This demonstrates Agentic RAG with:
 6. Validation Agent (quality verification)
 7. Adaptive execution flow
 """
+import os
 import sys
+from collections import Counter
 from pathlib import Path
 
 # Add src to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from src.vector_store import VectorStore, build_vector_store
+from examples._shared import get_vector_store
 from src.rag.agentic_rag import AgenticRAG
 
+INTERACTIVE = os.getenv("INTERACTIVE", "0") == "1"
+
 def main():
     print("="*70)
     print("AGENTIC RAG DEMO")
     print("="*70)
 
-    # Build/load vector store
+    # Build/load vector store (loading started when _shared was imported)
     print("\nInitializing vector store...")
-    vector_store = VectorStore()
-
-    if vector_store.count() == 0:
-        print("Building vector store from knowledge base...")
-        vector_store = build_vector_store()
-    else:
-        print(f"Vector store loaded: {vector_store.count()} documents")
+    vector_store = get_vector_store()
+    print(f"Vector store loaded: {vector_store.count()} documents")
 
     # Initialize Agentic RAG
     print("\nInitializing Agentic RAG with multi-agent system...")
@@ -108,10 +107,7 @@ def main():
         # Show agent execution trace
         print(f"\n🤖 Agent Execution Trace:")
         trace = result.get('trace', [])
-        agent_counts = {}
-        for entry in trace:
-            agent = entry['agent']
-            agent_counts[agent] = agent_counts.get(agent, 0) + 1
+        agent_counts = Counter(entry['agent'] for entry in trace)
 
         for agent, count in agent_counts.items():
             print(f"   {agent}: {count} call(s)")
@@ -128,8 +124,8 @@ def main():
                 if relevance:
                     print(f"       Relevance: {relevance:.2f}")
 
-        # Wait for user
-        if i < len(test_queries):
+        # Wait for user (set INTERACTIVE=1 to pause between queries)
+        if INTERACTIVE and i < len(test_queries):
             input("\n⏎ Press Enter to continue to next query...")
 
     # Show detailed trace for last query
@@ -0,0 +1,31 @@
+"""
+Helpers shared by the demo scripts
+
+Importing this module starts loading the vector store in a background
+thread, so it overlaps with the slower imports (reranker, agents) that
+follow in each demo.
+"""
+import functools
+import threading
+from src.vector_store import VectorStore, build_vector_store
+
+_lock = threading.Lock()
+
+@functools.lru_cache(maxsize=1)
+def _load_vector_store() -> VectorStore:
+    vector_store = VectorStore()
+
+    if vector_store.count() == 0:
+        print("Building vector store from knowledge base...")
+        return build_vector_store()
+
+    return vector_store
+
+def get_vector_store() -> VectorStore:
+    """Get the process-wide vector store, building it if empty"""
+    # The lock makes callers wait for an in-flight load instead of
+    # starting a second one
+    with _lock:
+        return _load_vector_store()
+
+threading.Thread(target=get_vector_store, daemon=True).start()
@@ -1,14 +1,150 @@
 """
 Base agent class and context management
 """
+import atexit
+import functools
+import hashlib
+import orjson
+import time
+import threading
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+from collections import deque
 from datetime import datetime
 from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+import httpx
 from openai import OpenAI
-from src.config import get_openai_api_key
+from src.config import settings, get_openai_api_key
+from src.semantic_cache import QueryCache
 
-@dataclass
+# Shared pool for independent LLM calls (I/O-bound, so threads overlap well)
+LLM_EXECUTOR = ThreadPoolExecutor(max_workers=8)
+
+# Responses keyed by a hash of the full request (see BaseAgent._cache_key);
+# only used when settings.llm_cache is on
+_LLM_CACHE = QueryCache(max_size=1024)
+
+@functools.lru_cache(maxsize=1)
+def get_openai_client() -> OpenAI:
+    """Return the chat client shared by all agents and pipelines (one HTTP/2 pool)"""
+    client = OpenAI(
+        api_key=get_openai_api_key(),
+        http_client=httpx.Client(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+            timeout=30.0
+        )
+    )
+
+    atexit.register(client.close)
+
+    if settings.llm_warmup:
+        threading.Thread(target=_warm_up, args=(client,), daemon=True).start()
+
+    return client
+
+def _warm_up(client: OpenAI):
+    """Open a pooled connection with a 1-token request, hiding TLS setup"""
+    try:
+        client.chat.completions.create(
+            model=settings.openai_fast_model,
+            messages=[{"role": "user", "content": "ping"}],
+            max_tokens=1
+        )
+    except Exception:
+        # Warm-up is best effort; the first real call will surface errors
+        pass
+
+# Trace results with a longer repr are replaced by a summary
+MAX_TRACE_RESULT_CHARS = 4096
+
+# Oldest trace entries are dropped beyond this many
+MAX_TRACE_ENTRIES = 256
+
+def summarize_result(result: Any) -> Any:
+    """Shallow summary of a trace result: sizes and document ids only"""
+    if isinstance(result, dict):
+        return {
+            key: f"<{type(value).__name__} of {len(value)}>"
+            if isinstance(value, (list, dict, str)) else value
+            for key, value in result.items()
+        }
+    if isinstance(result, list):
+        return {
+            "count": len(result),
+            "ids": [item['id'] for item in result
+                    if isinstance(item, dict) and 'id' in item]
+        }
+    return f"<{type(result).__name__}>"
+
+def format_timestamp(ts_ns: int) -> str:
+    """Format a trace timestamp (nanoseconds since epoch) as ISO 8601"""
+    return datetime.fromtimestamp(ts_ns / 1e9).isoformat()
+
+class JSONFieldScanner:
+    """
+    Incrementally scan a streamed JSON object for completed top-level fields
+
+    Each top-level member is decoded as soon as the comma or closing brace
+    after it arrives, so callers can act before the rest of the object is
+    generated. Text before the opening brace (e.g. a code fence) is ignored.
+    """
+
+    def __init__(self, on_field: Callable[[str, Any], None]):
+        self.on_field = on_field
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.member: List[str] = []
+
+    def feed(self, text: str):
+        """Consume the next chunk of the response"""
+        for char in text:
+            if self.depth == 0:
+                if char == '{':
+                    self.depth = 1
+                continue
+
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in '{[':
+                self.depth += 1
+            elif char in '}]':
+                self.depth -= 1
+                if self.depth == 0:
+                    self._emit()
+                    continue
+            elif char == ',' and self.depth == 1:
+                self._emit()
+                continue
+
+            self.member.append(char)
+
+    def _emit(self):
+        """Decode the buffered member and report it"""
+        text = "".join(self.member).strip()
+        self.member = []
+        if not text:
+            return
+
+        try:
+            field_dict = orjson.loads("{" + text + "}")
+        except orjson.JSONDecodeError:
+            # Malformed member; the full parse at the end will report it
+            return
+
+        for key, value in field_dict.items():
+            self.on_field(key, value)
+
+@dataclass(slots=True)
 class AgentContext:
     """Shared context across all agents"""
 
@@ -35,15 +171,26 @@ class AgentContext:
     validation_results: Dict[str, Any] = field(default_factory=dict)
 
     # Execution trace
-    execution_trace: List[Dict[str, Any]] = field(default_factory=list)
+    execution_trace: Deque[Dict[str, Any]] = field(
+        default_factory=lambda: deque(maxlen=MAX_TRACE_ENTRIES)
+    )
 
     # Metadata
     metadata: Dict[str, Any] = field(default_factory=dict)
 
     def add_trace(self, agent_name: str, action: str, result: Any):
         """Add execution trace entry"""
+        # Keep large payloads (document lists, full plans) out of the trace
+        text = repr(result)
+        if len(text) > MAX_TRACE_RESULT_CHARS:
+            result = {
+                "summary": summarize_result(result),
+                "size": len(text),
+                "sha": hashlib.md5(text.encode()).hexdigest()
+            }
+
         self.execution_trace.append({
-            "timestamp": datetime.now().isoformat(),
+            "ts_ns": time.time_ns(),
             "agent": agent_name,
             "action": action,
             "result": result
@@ -54,17 +201,22 @@ class AgentContext:
         lines = ["\nExecution Trace:"]
         for entry in self.execution_trace:
             lines.append(
-                f"  [{entry['timestamp']}] {entry['agent']}: {entry['action']}"
+                f"  [{format_timestamp(entry['ts_ns'])}] {entry['agent']}: {entry['action']}"
             )
         return "\n".join(lines)
 
 class BaseAgent(ABC):
     """Base class for all agents"""
 
-    def __init__(self, name: str, model: str = "gpt-4-turbo-preview"):
+    def __init__(
+        self,
+        name: str,
+        model: str = "gpt-4-turbo-preview",
+        client: Optional[OpenAI] = None
+    ):
         self.name = name
         self.model = model
-        self.client = OpenAI(api_key=get_openai_api_key())
+        self.client = client or get_openai_client()
 
     @abstractmethod
     def execute(self, context: AgentContext) -> Dict[str, Any]:
@@ -88,7 +240,9 @@ class BaseAgent(ABC):
         prompt: str,
         system_prompt: Optional[str] = None,
         temperature: float = 0.1,
-        response_format: Optional[Dict] = None
+        response_format: Optional[Dict] = None,
+        model: Optional[str] = None,
+        use_cache: bool = True
     ) -> str:
         """
         Call LLM with error handling
@@ -98,10 +252,145 @@ class BaseAgent(ABC):
             system_prompt: System prompt (optional)
             temperature: Sampling temperature
             response_format: Response format (e.g., {"type": "json_object"})
+            model: Model override for this call (defaults to self.model)
+            use_cache: Allow a cached response (pass False when a fresh
+                sample is wanted, e.g. regenerating a rejected answer)
 
         Returns:
             LLM response content
         """
+        kwargs = self._build_llm_kwargs(
+            prompt, system_prompt, temperature, response_format, model
+        )
+
+        key = self._cache_key(kwargs) if use_cache else None
+        if key:
+            cached = _LLM_CACHE.get(key)
+            if cached is not None:
+                return cached
+
+        response = self.client.chat.completions.create(**kwargs)
+        content = response.choices[0].message.content
+
+        if response_format:
+            self._check_json_complete(content)
+
+        if key:
+            _LLM_CACHE.add(key, content)
+
+        return content
+
+    def call_llm_stream(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: float = 0.1,
+        model: Optional[str] = None,
+        use_cache: bool = True
+    ) -> Iterator[str]:
+        """
+        Call LLM and yield the response incrementally
+
+        Args:
+            prompt: User prompt
+            system_prompt: System prompt (optional)
+            temperature: Sampling temperature
+            model: Model override for this call (defaults to self.model)
+            use_cache: Allow a cached response
+
+        Yields:
+            Response content deltas as they arrive
+        """
+        kwargs = self._build_llm_kwargs(
+            prompt, system_prompt, temperature, None, model
+        )
+
+        key = self._cache_key(kwargs) if use_cache else None
+        if key:
+            cached = _LLM_CACHE.get(key)
+            if cached is not None:
+                yield cached
+                return
+
+        parts = []
+        stream = self.client.chat.completions.create(stream=True, **kwargs)
+
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield delta
+
+        if key:
+            _LLM_CACHE.add(key, "".join(parts))
+
+    def call_llm_json(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: float = 0.1,
+        model: Optional[str] = None,
+        on_field: Optional[Callable[[str, Any], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Stream a JSON object response without JSON mode
+
+        The prompt must ask for a JSON object. Skipping response_format
+        avoids constrained decoding, and on_field sees each top-level
+        field as soon as it is complete.
+
+        Args:
+            prompt: User prompt
+            system_prompt: System prompt (optional)
+            temperature: Sampling temperature
+            model: Model override for this call (defaults to self.model)
+            on_field: Called with (key, value) for each completed field
+
+        Returns:
+            Parsed JSON object
+        """
+        scanner = JSONFieldScanner(on_field) if on_field else None
+        parts = []
+
+        for delta in self.call_llm_stream(prompt, system_prompt, temperature, model):
+            parts.append(delta)
+            if scanner:
+                scanner.feed(delta)
+
+        content = "".join(parts)
+
+        # Tolerate prose or code fences around the object
+        start, end = content.find('{'), content.rfind('}')
+        if start == -1 or end < start:
+            raise ValueError(f"{self.name} received incomplete JSON from LLM")
+
+        return orjson.loads(content[start:end + 1])
+
+    def _check_json_complete(self, content: str):
+        """Fail fast on a truncated JSON-mode response (e.g. hit max tokens)"""
+        if not content or not content.rstrip().endswith('}'):
+            raise ValueError(f"{self.name} received incomplete JSON from LLM")
+
+    def _cache_key(self, kwargs: Dict[str, Any]) -> Optional[str]:
+        """Hash request arguments into a response cache key (None if disabled)"""
+        if not settings.llm_cache:
+            return None
+
+        return hashlib.sha256(
+            orjson.dumps(kwargs, option=orjson.OPT_SORT_KEYS)
+        ).hexdigest()
+
+    def _build_llm_kwargs(
+        self,
+        prompt: str,
+        system_prompt: Optional[str],
+        temperature: float,
+        response_format: Optional[Dict],
+        model: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Build chat completion arguments shared by the call_llm variants"""
         messages = []
 
         if system_prompt:
@@ -110,7 +399,7 @@ class BaseAgent(ABC):
         messages.append({"role": "user", "content": prompt})
 
         kwargs = {
-            "model": self.model,
+            "model": model or self.model,
             "messages": messages,
             "temperature": temperature
         }
@@ -118,6 +407,20 @@ class BaseAgent(ABC):
         if response_format:
             kwargs["response_format"] = response_format
 
-        response = self.client.chat.completions.create(**kwargs)
+        return kwargs
+
+    def call_llm_many(self, prompts: List[str], **kwargs) -> List[str]:
+        """
+        Call LLM for several independent prompts concurrently
+
+        Args:
+            prompts: User prompts
+            **kwargs: Extra arguments passed to call_llm
 
-        return response.choices[0].message.content
+        Returns:
+            LLM response contents, in the same order as prompts
+        """
+        return list(LLM_EXECUTOR.map(
+            lambda prompt: self.call_llm(prompt, **kwargs),
+            prompts
+        ))
@@ -1,20 +1,84 @@
 """
 Generation Agent - Generates high-quality responses
 """
-import json
-from typing import Dict, Any, List, Optional
+import io
+from typing import Dict, Any, Final, Iterator, List, Optional, Tuple
+from openai import OpenAI
 from src.agents.base_agent import BaseAgent, AgentContext
+from src.tokenizer import count_tokens, truncate_to_tokens
+
+# System prompts are constants so every request starts with an identical
+# prefix, which OpenAI's automatic prompt caching can reuse
+SYSTEM_COMPARE: Final[str] = """You are a customer support assistant.
+Your task is to compare information from multiple sources and provide a clear comparison.
+
+Guidelines:
+- Compare the sources systematically
+- Highlight similarities and differences
+- Use specific details from each source
+- Cite sources using [Source N] notation
+- Present comparison in clear, organized format"""
+
+SYSTEM_SYNTH: Final[str] = """You are a customer support assistant.
+Your task is to synthesize information from multiple sources into a coherent answer.
+
+Guidelines:
+- Combine information logically
+- Resolve any contradictions
+- Provide comprehensive answer
+- Cite sources using [Source N] notation
+- Maintain accuracy to source material"""
+
+SYSTEM_GENERATE: Final[str] = """You are a helpful customer support assistant.
+
+Guidelines:
+- Answer based only on provided context
+- Be accurate and specific
+- Cite sources using [Source N] notation
+- Be concise but complete
+- If context is insufficient, acknowledge limitations
+- Maintain professional, friendly tone"""
 
 class GenerationAgent(BaseAgent):
     """Generates responses from context"""
 
-    def __init__(self, model: str = "gpt-4-turbo-preview"):
-        super().__init__(name="GenerationAgent", model=model)
+    def __init__(
+        self,
+        model: str = "gpt-4-turbo-preview",
+        model_small: str = "gpt-4o-mini",
+        max_context_tokens: int = 6000,
+        client: OpenAI = None
+    ):
+        super().__init__(name="GenerationAgent", model=model, client=client)
+        self.model_large = model
+        self.model_small = model_small
+        self.max_context_tokens = max_context_tokens
+
+    def select_model(self, context: AgentContext, action: str) -> str:
+        """
+        Pick the model for this generation
+
+        Comparison, synthesis and complex queries get the large model;
+        everything else is answered by the small, cheaper one.
+
+        Args:
+            context: Agent context
+            action: Generation action
+
+        Returns:
+            Model name
+        """
+        if action in ('compare', 'synthesize'):
+            return self.model_large
+        if context.route_info.get('complexity') == 'complex':
+            return self.model_large
+        return self.model_small
 
     def build_context(
         self,
         documents: List[Dict[str, Any]],
-        plan_step: Optional[Dict[str, Any]] = None
+        plan_step: Optional[Dict[str, Any]] = None,
+        max_doc_tokens: Optional[int] = None
     ) -> str:
         """
         Build context string from documents
@@ -22,6 +86,7 @@ class GenerationAgent(BaseAgent):
         Args:
             documents: Context documents
             plan_step: Current plan step (for specialized formatting)
+            max_doc_tokens: Token budget per document (no limit if None)
 
         Returns:
             Formatted context string
@@ -29,100 +94,161 @@ class GenerationAgent(BaseAgent):
         if not documents:
             return ""
 
-        parts = []
+        buf = io.StringIO()
 
         for i, doc in enumerate(documents, 1):
-            parts.append(f"[Source {i}]")
-            parts.append(doc['content'])
+            content = doc['content']
+            if max_doc_tokens is not None:
+                content = truncate_to_tokens(content, max_doc_tokens)
+
+            buf.write(f"[Source {i}]\n{content}\n")
 
             # Add grading insights if available
-            if 'grading' in doc and 'key_points' in doc['grading']:
-                key_points = doc['grading']['key_points']
-                if key_points:
-                    parts.append(f"Key points: {', '.join(key_points)}")
+            key_points = doc.get('grading', {}).get('key_points')
+            if key_points:
+                buf.write(f"Key points: {', '.join(key_points)}\n")
 
-            parts.append("")  # Blank line
+            buf.write("\n")  # Blank line
 
-        return "\n".join(parts)
+        return buf.getvalue()
 
-    def execute(
+    def build_prompts(
         self,
         context: AgentContext,
-        documents: List[Dict[str, Any]] = None,
+        docs: List[Dict[str, Any]],
         plan_step: Optional[Dict[str, Any]] = None
-    ) -> str:
+    ) -> Tuple[str, str, str]:
         """
-        Generate answer
+        Build system and user prompts for the current action
 
         Args:
             context: Agent context
-            documents: Context documents (uses context.graded_docs if None)
+            docs: Context documents
             plan_step: Current plan step
 
         Returns:
-            Generated answer
+            Tuple of (action, system_prompt, user_prompt)
         """
-        docs = documents or context.graded_docs
         query = context.query
 
         # Determine generation mode
         action = plan_step.get('action') if plan_step else 'generate'
 
-        # Build context
-        context_str = self.build_context(docs, plan_step)
-
-        # Create prompts based on action
+        # Pick the static system prompt for this action
         if action == 'compare':
-            system_prompt = """You are a customer support assistant.
-Your task is to compare information from multiple sources and provide a clear comparison.
-
-Guidelines:
-- Compare the sources systematically
-- Highlight similarities and differences
-- Use specific details from each source
-- Cite sources using [Source N] notation
-- Present comparison in clear, organized format"""
-
+            system_prompt = SYSTEM_COMPARE
         elif action == 'synthesize':
-            system_prompt = """You are a customer support assistant.
-Your task is to synthesize information from multiple sources into a coherent answer.
-
-Guidelines:
-- Combine information logically
-- Resolve any contradictions
-- Provide comprehensive answer
-- Cite sources using [Source N] notation
-- Maintain accuracy to source material"""
-
+            system_prompt = SYSTEM_SYNTH
         else:  # generate
-            system_prompt = """You are a helpful customer support assistant.
+            system_prompt = SYSTEM_GENERATE
+
+        # Split what is left of the context window evenly across documents
+        max_doc_tokens = None
+        if docs:
+            budget = (
+                self.max_context_tokens
+                - count_tokens(system_prompt)
+                - count_tokens(query)
+            )
+            max_doc_tokens = max(budget // len(docs), 0)
 
-Guidelines:
-- Answer based only on provided context
-- Be accurate and specific
-- Cite sources using [Source N] notation
-- Be concise but complete
-- If context is insufficient, acknowledge limitations
-- Maintain professional, friendly tone"""
+        # Build context
+        context_str = self.build_context(docs, plan_step, max_doc_tokens)
 
         if context_str:
-            user_prompt = f"""Context:
-{context_str}
+            # Stable instruction first, variable context and question last,
+            # so consecutive requests share the longest possible prefix
+            user_prompt = f"""Please provide a helpful answer based on the context below.
 
-Question: {query}
+Context:
+{context_str}
 
-Please provide a helpful answer based on the context above."""
+Question: {query}"""
         else:
             # No context - conversational response
             user_prompt = query
 
-        # Generate response
+        return action, system_prompt, user_prompt
+
+    def execute(
+        self,
+        context: AgentContext,
+        documents: List[Dict[str, Any]] = None,
+        plan_step: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """
+        Generate answer
+
+        Args:
+            context: Agent context
+            documents: Context documents (uses context.graded_docs if None)
+            plan_step: Current plan step
+
+        Returns:
+            Generated answer
+        """
+        docs = documents or context.graded_docs
+        action, system_prompt, user_prompt = self.build_prompts(
+            context, docs, plan_step
+        )
+
+        # Generate response (a regeneration must not get the rejected answer back)
         response = self.call_llm(
             prompt=user_prompt,
             system_prompt=system_prompt,
-            temperature=0.1
+            temperature=0.1,
+            model=self.select_model(context, action),
+            use_cache=not context.metadata.get('regenerate')
+        )
+
+        return self._record_answer(context, action, docs, response)
+
+    def execute_stream(
+        self,
+        context: AgentContext,
+        documents: List[Dict[str, Any]] = None,
+        plan_step: Optional[Dict[str, Any]] = None
+    ) -> Iterator[str]:
+        """
+        Generate answer, yielding it as it streams in
+
+        context.generated_answer is set once the stream completes.
+
+        Args:
+            context: Agent context
+            documents: Context documents (uses context.graded_docs if None)
+            plan_step: Current plan step
+
+        Yields:
+            Answer chunks
+        """
+        docs = documents or context.graded_docs
+        action, system_prompt, user_prompt = self.build_prompts(
+            context, docs, plan_step
         )
 
+        parts: List[str] = []
+
+        for chunk in self.call_llm_stream(
+            prompt=user_prompt,
+            system_prompt=system_prompt,
+            temperature=0.1,
+            model=self.select_model(context, action),
+            use_cache=not context.metadata.get('regenerate')
+        ):
+            parts.append(chunk)
+            yield chunk
+
+        self._record_answer(context, action, docs, "".join(parts))
+
+    def _record_answer(
+        self,
+        context: AgentContext,
+        action: str,
+        docs: List[Dict[str, Any]],
+        response: str
+    ) -> str:
+        """Log the generation and store the answer on the context"""
         # Log action
         self.log_action(
             context,
@@ -1,59 +1,217 @@
 """
 Grading Agent - Evaluates document relevance and quality
 """
-import json
+import orjson
 from typing import Dict, Any, List
+from openai import OpenAI
 from src.agents.base_agent import BaseAgent, AgentContext
+from src.reranker import DocumentReranker
+from src.semantic_cache import QueryCache
+from src.tokenizer import truncate_to_tokens
+from src.vector_store import content_sha1
 
 class GradingAgent(BaseAgent):
     """Grades documents for relevance and quality"""
 
-    def __init__(self, model: str = "gpt-3.5-turbo"):
-        super().__init__(name="GradingAgent", model=model)
+    def __init__(
+        self,
+        reranker: DocumentReranker = None,
+        model: str = "gpt-3.5-turbo",
+        max_doc_tokens: int = 150,
+        client: OpenAI = None
+    ):
+        super().__init__(name="GradingAgent", model=model, client=client)
+        self.reranker = reranker or DocumentReranker()
+        self.max_doc_tokens = max_doc_tokens
 
-    def grade_document(
+        # Gradings already computed, so refinement iterations that retrieve
+        # the same documents for the same query don't grade them again.
+        # Keyed on content too, so a document edited by a rebuild is regraded
+        self._grade_cache = QueryCache(max_size=4096)
+
+    def score_documents(
         self,
         query: str,
-        document: Dict[str, Any]
-    ) -> Dict[str, Any]:
+        documents: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
         """
-        Grade a single document
+        Score document relevance with the cross-encoder (no LLM call)
 
         Args:
             query: User query
-            document: Document to grade
+            documents: Documents to score
 
         Returns:
-            Grading result
+            Grading results (without key points) in document order
         """
-        prompt = f"""Grade this document's relevance to the query.
+        scores = self.reranker.score(query, documents)
 
-Query: "{query}"
+        return [
+            {
+                "is_relevant": score > 0.5,
+                "relevance_score": score,
+                "reasoning": f"Cross-encoder relevance {score:.2f}",
+                "key_points": []
+            }
+            for score in scores
+        ]
+
+    def build_key_points_prompt(
+        self,
+        query: str,
+        documents: List[Dict[str, Any]]
+    ) -> str:
+        """
+        Build a prompt that extracts key points from several documents
+
+        Args:
+            query: User query
+            documents: Relevant documents
+
+        Returns:
+            Key point extraction prompt
+        """
+        doc_blocks = "\n\n".join(
+            f"[Doc {i}]\n{truncate_to_tokens(doc['content'], self.max_doc_tokens)}"
+            for i, doc in enumerate(documents)
+        )
+
+        return f"""Extract the key points from each document that help answer the query.
 
-Document:
-{document['content'][:600]}
+Query: "{query}"
 
-Evaluate:
-1. Relevance: Does it help answer the query?
-2. Completeness: Does it provide sufficient information?
-3. Specificity: Is it specific or too generic?
+Documents:
+{doc_blocks}
 
-Respond in JSON:
+Respond in JSON with one entry per document, using the document's index:
 {{
-    "is_relevant": true/false,
-    "relevance_score": 0.0-1.0,
-    "reasoning": "brief explanation",
-    "key_points": ["point 1", "point 2", ...]
+    "documents": [
+        {{
+            "index": 0,
+            "key_points": ["point 1", "point 2", ...]
+        }},
+        ...
+    ]
 }}"""
 
+    def extract_key_points(
+        self,
+        query: str,
+        documents: List[Dict[str, Any]]
+    ) -> List[List[str]]:
+        """
+        Extract key points for several documents in a single LLM call
+
+        Args:
+            query: User query
+            documents: Relevant documents
+
+        Returns:
+            Key points per document, in document order
+        """
+        if not documents:
+            return []
+
+        llm_kwargs = {"temperature": 0.1, "response_format": {"type": "json_object"}}
+
         response = self.call_llm(
-            prompt=prompt,
-            temperature=0.1,
-            response_format={"type": "json_object"}
+            prompt=self.build_key_points_prompt(query, documents),
+            **llm_kwargs
         )
 
-        grading = json.loads(response)
-        return grading
+        by_index = self._parse_key_points(response)
+        missing = [i for i in range(len(documents)) if i not in by_index]
+
+        if missing and len(documents) > 1:
+            # Retry documents the model skipped, one call each in parallel
+            retried = self.call_llm_many(
+                [self.build_key_points_prompt(query, [documents[i]]) for i in missing],
+                **llm_kwargs
+            )
+            by_index.update(
+                (i, self._parse_key_points(response).get(0, []))
+                for i, response in zip(missing, retried)
+            )
+
+        return [by_index.get(i, []) for i in range(len(documents))]
+
+    def _parse_key_points(self, response: str) -> Dict[int, List[str]]:
+        """Map each returned key point list to its document index"""
+        return {
+            entry.get('index'): entry.get('key_points', [])
+            for entry in orjson.loads(response).get('documents', [])
+        }
+
+    def grade_documents_batch(
+        self,
+        query: str,
+        documents: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Grade several documents: cross-encoder scores for all of them,
+        then one LLM call for the key points of the relevant ones
+
+        Args:
+            query: User query
+            documents: Documents to grade
+
+        Returns:
+            Grading results in the same order as documents
+        """
+        if not documents:
+            return []
+
+        keys = self._cache_keys(query, documents)
+        gradings = [self._grade_cache.get(key) for key in keys]
+        pending = [i for i, grading in enumerate(gradings) if grading is None]
+
+        if pending:
+            fresh = self.score_documents(query, [documents[i] for i in pending])
+            relevant = [i for i, grading in enumerate(fresh) if grading['is_relevant']]
+
+            key_points = self.extract_key_points(
+                query, [documents[pending[i]] for i in relevant]
+            )
+            for i, points in zip(relevant, key_points):
+                fresh[i]['key_points'] = points
+
+            for i, grading in zip(pending, fresh):
+                self._grade_cache.add(keys[i], grading)
+                gradings[i] = grading
+
+        # Copies, so callers that annotate a grading don't change the cache
+        return [
+            {**grading, 'key_points': list(grading['key_points'])}
+            for grading in gradings
+        ]
+
+    def _cache_keys(
+        self,
+        query: str,
+        documents: List[Dict[str, Any]]
+    ) -> List[str]:
+        """Grade cache keys: query, document id and content hash"""
+        return [
+            f"{query}\n{doc['id']}\n{content_sha1(doc['content'])}"
+            for doc in documents
+        ]
+
+    def grade_document(
+        self,
+        query: str,
+        document: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Grade a single document
+
+        Args:
+            query: User query
+            document: Document to grade
+
+        Returns:
+            Grading result
+        """
+        return self.grade_documents_batch(query, [document])[0]
 
     def execute(
         self,
@@ -75,12 +233,20 @@ Respond in JSON:
         if not docs_to_grade:
             return []
 
-        relevant_docs = []
+        gradings = self.grade_documents_batch(context.query, docs_to_grade)
 
-        for doc in docs_to_grade:
-            # Grade document
-            grading = self.grade_document(context.query, doc)
+        return self._apply_gradings(context, docs_to_grade, gradings)
+
+    def _apply_gradings(
+        self,
+        context: AgentContext,
+        docs_to_grade: List[Dict[str, Any]],
+        gradings: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """Attach gradings to documents and keep the relevant ones"""
+        relevant_docs = []
 
+        for doc, grading in zip(docs_to_grade, gradings):
             # Add grading to document
             doc['grading'] = grading
 
@@ -1,15 +1,58 @@
 """
 Planning Agent - Creates execution plans for complex queries
 """
-import json
-from typing import Dict, Any, List
+import orjson
+from typing import Dict, Any, List, Tuple
+from openai import OpenAI
 from src.agents.base_agent import BaseAgent, AgentContext
 
+# Canonical plans for the routes RouterAgent emits, keyed by
+# (suggested_strategy, complexity). Retrieve steps target the user query.
+_PLAN_TEMPLATES: Dict[Tuple[str, str], Dict[str, Any]] = {
+    ('direct', 'medium'): {
+        "plan_type": "single",
+        "plan": [
+            {"step": 1, "action": "retrieve", "description": "Retrieve documents for the query"},
+            {"step": 2, "action": "grade", "target": "retrieved_docs", "description": "Keep relevant documents"},
+            {"step": 3, "action": "generate", "context": "graded_docs", "description": "Answer from graded documents"}
+        ]
+    },
+    ('multi_hop', 'medium'): {
+        "plan_type": "multi_hop",
+        "plan": [
+            {"step": 1, "action": "retrieve", "multi_query": True, "description": "Retrieve each piece of information the query depends on"},
+            {"step": 2, "action": "grade", "target": "retrieved_docs", "description": "Keep relevant documents"},
+            {"step": 3, "action": "synthesize", "context": "graded_docs", "description": "Combine the retrieved information into one answer"}
+        ]
+    },
+    ('comparison', 'medium'): {
+        "plan_type": "comparison",
+        "plan": [
+            {"step": 1, "action": "retrieve", "multi_query": True, "description": "Retrieve information for each item being compared"},
+            {"step": 2, "action": "grade", "target": "retrieved_docs", "description": "Keep relevant documents"},
+            {"step": 3, "action": "compare", "context": "graded_docs", "description": "Compare the items side by side"}
+        ]
+    }
+}
+# Complex routes follow the same shapes; only the planning LLM call differed
+_PLAN_TEMPLATES[('direct', 'complex')] = _PLAN_TEMPLATES[('multi_hop', 'medium')]
+_PLAN_TEMPLATES[('multi_hop', 'complex')] = _PLAN_TEMPLATES[('multi_hop', 'medium')]
+_PLAN_TEMPLATES[('comparison', 'complex')] = _PLAN_TEMPLATES[('comparison', 'medium')]
+
 class PlanningAgent(BaseAgent):
     """Creates step-by-step plans for query execution"""
 
-    def __init__(self, model: str = "gpt-4-turbo-preview"):
-        super().__init__(name="PlanningAgent", model=model)
+    def __init__(
+        self,
+        model: str = "gpt-4-turbo-preview",
+        model_small: str = "gpt-4o-mini",
+        confidence_threshold: float = 0.8,
+        client: OpenAI = None
+    ):
+        super().__init__(name="PlanningAgent", model=model, client=client)
+        self.model_large = model
+        self.model_small = model_small
+        self.confidence_threshold = confidence_threshold
 
     def execute(self, context: AgentContext) -> List[Dict[str, Any]]:
         """
@@ -27,7 +70,7 @@ class PlanningAgent(BaseAgent):
         # Simple queries get simple plans
         if route_info.get('complexity') == 'simple':
             plan = [
-                {"action": "retrieve", "target": query, "params": {"top_k": 5}},
+                {"action": "retrieve", "target": query},
                 {"action": "grade", "target": "retrieved_docs"},
                 {"action": "generate", "context": "graded_docs"}
             ]
@@ -36,6 +79,20 @@ class PlanningAgent(BaseAgent):
             context.plan = plan
             return plan
 
+        # Known routes get a canonical plan without an LLM call
+        key = (route_info.get('suggested_strategy'), route_info.get('complexity'))
+        if key in _PLAN_TEMPLATES:
+            template = _PLAN_TEMPLATES[key]
+            plan = [
+                {**step, "target": step.get("target", query)}
+                for step in template['plan']
+            ]
+
+            self.log_action(context, "create_template_plan", plan)
+            context.plan = plan
+            context.metadata['plan_type'] = template['plan_type']
+            return plan
+
         # Complex queries need detailed planning
         prompt = f"""Create a step-by-step execution plan for this query.
 
@@ -52,6 +109,9 @@ Available actions:
 - synthesize: Combine information from multiple sources
 - validate: Check answer quality
 
+Steps that do not depend on each other (e.g. retrieving each item of a
+comparison) can run in parallel, so list only real dependencies.
+
 Create a detailed plan as JSON array:
 {{
     "plan": [
@@ -60,7 +120,8 @@ Create a detailed plan as JSON array:
             "action": "...",
             "target": "...",
             "description": "...",
-            "params": {{}}
+            "params": {{}},
+            "depends_on": [step numbers whose output this step needs]
         }},
         ...
     ],
@@ -68,13 +129,20 @@ Create a detailed plan as JSON array:
     "expected_iterations": number
 }}"""
 
+        # A confident route needs less reasoning to plan, so use the small model
+        if route_info.get('confidence', 0) >= self.confidence_threshold:
+            model = self.model_small
+        else:
+            model = self.model_large
+
         response = self.call_llm(
             prompt=prompt,
             temperature=0.1,
-            response_format={"type": "json_object"}
+            response_format={"type": "json_object"},
+            model=model
         )
 
-        plan_data = json.loads(response)
+        plan_data = orjson.loads(response)
         plan = plan_data.get('plan', [])
 
         self.log_action(context, "create_complex_plan", plan_data)
@@ -1,11 +1,16 @@
 """
 Retrieval Agent - Handles intelligent document retrieval
 """
-import json
-from typing import Dict, Any, List
-from src.agents.base_agent import BaseAgent, AgentContext
+import orjson
+from itertools import chain
+from typing import Dict, Any, List, Optional, Tuple
+from openai import OpenAI
+from src.agents.base_agent import BaseAgent, AgentContext, LLM_EXECUTOR
 from src.vector_store import VectorStore
-from src.reranker import DocumentReranker
+from src.reranker import DocumentReranker, reciprocal_rank_fusion
+
+# Documents to retrieve per query for each route complexity
+TOP_K_BY_COMPLEXITY: Dict[str, int] = {'simple': 3, 'medium': 8, 'complex': 15}
 
 class RetrievalAgent(BaseAgent):
     """Intelligent retrieval with query formulation"""
@@ -14,16 +19,18 @@ class RetrievalAgent(BaseAgent):
         self,
         vector_store: VectorStore,
         reranker: DocumentReranker = None,
-        model: str = "gpt-3.5-turbo"
+        model: str = "gpt-3.5-turbo",
+        client: OpenAI = None
     ):
-        super().__init__(name="RetrievalAgent", model=model)
+        super().__init__(name="RetrievalAgent", model=model, client=client)
         self.vector_store = vector_store
         self.reranker = reranker or DocumentReranker()
 
     def formulate_queries(
         self,
         original_query: str,
-        plan_step: Dict[str, Any]
+        plan_step: Dict[str, Any],
+        search_queries: Optional[List[str]] = None
     ) -> List[str]:
         """
         Formulate search queries for retrieval
@@ -31,6 +38,8 @@ class RetrievalAgent(BaseAgent):
         Args:
             original_query: Original user query
             plan_step: Current plan step
+            search_queries: Sub-queries already produced by the router, used
+                instead of a separate decomposition call
 
         Returns:
             List of search queries
@@ -41,6 +50,10 @@ class RetrievalAgent(BaseAgent):
         if plan_step.get('action') == 'retrieve' and not plan_step.get('multi_query'):
             return [target]
 
+        # The router already decomposed the query in its classification call
+        if search_queries:
+            return search_queries
+
         # For complex cases, decompose into sub-queries
         prompt = f"""Generate 1-3 focused search queries to retrieve information.
 
@@ -63,14 +76,99 @@ Respond in JSON format:
             response_format={"type": "json_object"}
         )
 
-        result = json.loads(response)
+        result = orjson.loads(response)
         return result.get('queries', [target])
 
+    def prefetch(
+        self,
+        context: AgentContext,
+        top_k: int = max(TOP_K_BY_COMPLEXITY.values())
+    ):
+        """
+        Start retrieving for the raw query in the background
+
+        The candidates are also scored by the cross-encoder, so the next
+        execute() whose queries are just the raw query uses this result
+        without searching or scoring again.
+
+        Args:
+            context: Agent context
+            top_k: Number of documents to fetch
+        """
+        future = LLM_EXECUTOR.submit(self._speculate, context, top_k)
+        context.metadata['prefetch'] = (context.query, top_k, future)
+
+    def _speculate(
+        self,
+        context: AgentContext,
+        top_k: int
+    ) -> List[List[Dict[str, Any]]]:
+        """Search for the raw query and score the candidates ahead of routing"""
+        results = self._search_uncached(context, [context.query], top_k)
+
+        # Score every candidate, keeping the similarity order search() slices
+        results[0] = self.reranker.annotate(context.query, results[0])
+
+        return results
+
+    def discard_prefetch(self, context: AgentContext):
+        """
+        Drop an unused prefetch
+
+        Args:
+            context: Agent context
+        """
+        prefetch = context.metadata.pop('prefetch', None)
+        if prefetch:
+            prefetch[2].cancel()
+
+    def search(
+        self,
+        context: AgentContext,
+        queries: List[str],
+        top_k: int
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Search for queries, reusing a matching prefetch
+
+        Args:
+            context: Agent context
+            queries: Search queries
+            top_k: Number of documents per query
+
+        Returns:
+            Search results per query
+        """
+        prefetch = context.metadata.pop('prefetch', None)
+
+        if prefetch:
+            query, prefetch_k, future = prefetch
+            if queries == [query] and prefetch_k >= top_k:
+                # Results are ordered by distance, so a slice is the top_k search
+                return [docs[:top_k] for docs in future.result()]
+            future.cancel()
+
+        return self._search_uncached(context, queries, top_k)
+
+    def _search_uncached(
+        self,
+        context: AgentContext,
+        queries: List[str],
+        top_k: int
+    ) -> List[List[Dict[str, Any]]]:
+        """Search, reusing the query embedding computed earlier in the pipeline"""
+        query_vector = context.metadata.get('query_vector')
+
+        if query_vector is not None and queries == [context.query]:
+            return self.vector_store.search_by_vectors([query_vector.tolist()], top_k=top_k)
+
+        return self.vector_store.search_batch(queries, top_k=top_k)
+
     def execute(
         self,
         context: AgentContext,
         plan_step: Dict[str, Any] = None,
-        top_k: int = 10
+        top_k: Optional[int] = None
     ) -> List[Dict[str, Any]]:
         """
         Execute retrieval
@@ -78,36 +176,98 @@ Respond in JSON format:
         Args:
             context: Agent context
             plan_step: Current plan step
-            top_k: Number of documents to retrieve
+            top_k: Number of documents to retrieve (defaults by route
+                complexity, or the step's params top_k if that is smaller)
 
         Returns:
             Retrieved documents
         """
+        return self.merge(context, [self.retrieve(context, plan_step, top_k)])
+
+    def retrieve(
+        self,
+        context: AgentContext,
+        plan_step: Dict[str, Any] = None,
+        top_k: Optional[int] = None
+    ) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """
+        Search for one plan step without touching the shared context state
+
+        Independent steps can run this concurrently and merge() the results.
+
+        Args:
+            context: Agent context
+            plan_step: Current plan step
+            top_k: Number of documents to retrieve (defaults by route
+                complexity, or the step's params top_k if that is smaller)
+
+        Returns:
+            The search queries, and the documents they found
+        """
+        complexity = (context.route_info or {}).get('complexity', 'medium')
+        limit = TOP_K_BY_COMPLEXITY.get(complexity, TOP_K_BY_COMPLEXITY['medium'])
+
+        # A planned top_k can narrow the search, but not past the route's budget
+        params = (plan_step or {}).get('params') or {}
+        top_k = top_k or min(int(params.get('top_k') or limit), limit)
+
         # Formulate queries
         if plan_step:
-            queries = self.formulate_queries(context.query, plan_step)
+            queries = self.formulate_queries(
+                context.query,
+                plan_step,
+                context.route_info.get('search_queries')
+            )
         else:
             queries = [context.query]
 
-        all_docs = []
-        seen_ids = set()
+        # Retrieve for all queries in one batched search
+        results = self.search(context, queries, top_k)
+
+        # Deduplicate by id in one pass (ordered by first occurrence)
+        unique_docs = {doc['id']: doc for doc in chain.from_iterable(results)}
+
+        return queries, list(unique_docs.values())
+
+    def merge(
+        self,
+        context: AgentContext,
+        retrievals: List[Tuple[List[str], List[Dict[str, Any]]]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Fuse step retrievals into the context's retrieved documents
+
+        Args:
+            context: Agent context
+            retrievals: (queries, documents) from retrieve(), one per step
 
-        # Retrieve for each query
-        for query in queries:
-            docs = self.vector_store.search(query, top_k=top_k)
+        Returns:
+            Retrieved documents
+        """
+        queries = [query for step_queries, _ in retrievals for query in step_queries]
 
-            # Deduplicate
-            for doc in docs:
-                if doc['id'] not in seen_ids:
-                    all_docs.append(doc)
-                    seen_ids.add(doc['id'])
+        # Fuse with earlier retrievals for this query (e.g. retrieve_more).
+        # Rankings are keyed by their queries: a refinement iteration that
+        # re-runs a step adds nothing new, and fusing its ranking again
+        # would over-weight it
+        history = context.metadata.setdefault('retrieval_history', {})
+        for step_queries, docs in retrievals:
+            history.setdefault(tuple(step_queries), docs)
+
+        rankings = list(history.values())
+        if len(rankings) > 1:
+            all_docs = reciprocal_rank_fusion(rankings)
+        else:
+            all_docs = rankings[0]
 
-        # Rerank if multiple documents
-        if len(all_docs) > 3:
+        # Rerank if multiple documents; simple lookups keep vector order
+        complexity = (context.route_info or {}).get('complexity', 'medium')
+        if complexity != 'simple' and len(all_docs) > 3:
             all_docs = self.reranker.rerank(
                 context.query,
                 all_docs,
-                top_k=min(10, len(all_docs))
+                top_k=min(10, len(all_docs)),
+                reuse_scores=True  # Always scored against context.query here
             )
 
         # Log action
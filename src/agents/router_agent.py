@@ -1,28 +1,75 @@
 """
 Router Agent - Classifies queries and determines processing strategy
 """
-import json
-from typing import Dict, Any
+from typing import Any, Callable, Dict, Optional
+from openai import OpenAI
 from src.agents.base_agent import BaseAgent, AgentContext
+from src.embeddings import EmbeddingGenerator
+from src.semantic_cache import QueryCache, SemanticCache
+
+# Route fields tied to a query's exact wording, not reused for similar queries
+_QUERY_SPECIFIC_FIELDS = ('search_queries', 'reasoning')
 
 class RouterAgent(BaseAgent):
     """Routes queries to appropriate handlers"""
 
-    def __init__(self, model: str = "gpt-3.5-turbo"):
-        super().__init__(name="RouterAgent", model=model)
-
-    def execute(self, context: AgentContext) -> Dict[str, Any]:
+    def __init__(self, model: str = "gpt-3.5-turbo", client: OpenAI = None):
+        super().__init__(name="RouterAgent", model=model, client=client)
+        self.cache = SemanticCache(
+            embedder=EmbeddingGenerator(),
+            threshold=0.92,
+            max_size=1024
+        )
+        # Repeat queries skip even the embedding call
+        self.exact_cache = QueryCache(max_size=1024)
+
+    def execute(
+        self,
+        context: AgentContext,
+        on_field: Optional[Callable[[str, Any], None]] = None
+    ) -> Dict[str, Any]:
         """
         Classify query and determine processing strategy
 
         Args:
             context: Agent context with query
+            on_field: Called with (key, value) for each routing field as soon
+                as it is decoded from the streamed response
 
         Returns:
             Routing decision
         """
         query = context.query
 
+        # Reuse the route (and embedding) of a repeat query
+        exact = self.exact_cache.get(query)
+        if exact is not None:
+            cached, context.metadata['query_vector'] = exact
+            route_info = dict(cached)
+            self.log_action(context, "route_query_cached", route_info)
+            context.route_info = route_info
+            return route_info
+
+        # Reuse the route of a semantically identical earlier query
+        query_vector = context.metadata.get('query_vector')
+        if query_vector is None:
+            query_vector = self.cache.embed(query)
+            context.metadata['query_vector'] = query_vector
+        cached = self.cache.get(query_vector)
+
+        if cached is not None:
+            # Only the classification transfers; search queries and
+            # reasoning were written for the other query's wording, so
+            # sub-queries are re-derived by RetrievalAgent when needed
+            route_info = {
+                key: value for key, value in cached.items()
+                if key not in _QUERY_SPECIFIC_FIELDS
+            }
+            self.exact_cache.add(query, (route_info, query_vector))
+            self.log_action(context, "route_query_cached", route_info)
+            context.route_info = route_info
+            return route_info
+
         prompt = f"""Analyze this customer support query and classify it.
 
 Query: "{query}"
@@ -32,24 +79,19 @@ Determine:
 2. Complexity: simple (straightforward lookup), medium (requires some reasoning), complex (multi-step or comparison)
 3. Whether retrieval from knowledge base is needed
 4. Suggested strategy: direct (simple retrieval), multi_hop (multiple retrievals), comparison (compare sources), conversational (no retrieval needed)
+5. If retrieval is needed: 1-3 focused search phrases that together find the information in a knowledge base (one per item for comparisons)
+
+Respond with a single compact JSON object, fields in this order:
+{{"category": "...", "requires_retrieval": true/false, "complexity": "simple/medium/complex", "suggested_strategy": "...", "search_queries": ["query 1", ...] (empty if no retrieval needed), "confidence": 0.0-1.0, "reasoning": "brief explanation"}}"""
 
-Respond in JSON format:
-{{
-    "category": "...",
-    "complexity": "simple/medium/complex",
-    "requires_retrieval": true/false,
-    "suggested_strategy": "...",
-    "reasoning": "brief explanation",
-    "confidence": 0.0-1.0
-}}"""
-
-        response = self.call_llm(
+        # Streamed without JSON mode so decisions arrive before the reasoning
+        route_info = self.call_llm_json(
             prompt=prompt,
             temperature=0.1,
-            response_format={"type": "json_object"}
+            on_field=on_field
         )
-
-        route_info = json.loads(response)
+        self.cache.add(query_vector, route_info)
+        self.exact_cache.add(query, (route_info, query_vector))
 
         # Log action
         self.log_action(context, "route_query", route_info)
@@ -1,15 +1,22 @@
 """
 Validation Agent - Validates answer quality before returning to user
 """
-import json
+import hashlib
+import orjson
 from typing import Dict, Any, List
+from openai import OpenAI
 from src.agents.base_agent import BaseAgent, AgentContext
+from src.config import settings
+from src.semantic_cache import QueryCache, normalize_query
+from src.vector_store import content_sha1
 
 class ValidationAgent(BaseAgent):
     """Validates generated answers"""
 
-    def __init__(self, model: str = "gpt-4-turbo-preview"):
-        super().__init__(name="ValidationAgent", model=model)
+    def __init__(self, model: str = "gpt-4-turbo-preview", client: OpenAI = None):
+        super().__init__(name="ValidationAgent", model=model, client=client)
+        # Verdicts for identical answers, queries and sources
+        self.cache = QueryCache(max_size=1024)
 
     def execute(
         self,
@@ -27,83 +34,183 @@ class ValidationAgent(BaseAgent):
             Validation results
         """
         answer = answer or context.generated_answer
+        validation = self.execute_batch(context, [answer])[0]
 
-        if not answer:
-            return {
-                "is_valid": False,
-                "issues": ["No answer generated"],
-                "recommendation": "regenerate"
-            }
+        # Update context
+        context.validation_results = validation
+
+        return validation
+
+    def execute_batch(
+        self,
+        context: AgentContext,
+        answers: List[str]
+    ) -> List[Dict[str, Any]]:
+        """
+        Validate several candidate answers in a single LLM call
+
+        Args:
+            context: Agent context
+            answers: Candidate answers to the context query
+
+        Returns:
+            Validation results in the same order as answers
+        """
+        validations: List[Dict[str, Any]] = [None] * len(answers)
+
+        # A verdict only holds for the same answer to the same query over
+        # the same sources
+        sources = sorted(
+            (doc['id'], content_sha1(doc['content']))
+            for doc in context.graded_docs or []
+        )
+        key_prefix = f"{normalize_query(context.query)}\n{sources}\n"
+        answer_keys = [
+            hashlib.sha256((key_prefix + answer).encode()).hexdigest() if answer else None
+            for answer in answers
+        ]
+        pending = []
+
+        for i, (answer, answer_key) in enumerate(zip(answers, answer_keys)):
+            if not answer:
+                validations[i] = {
+                    "overall_quality": "poor",
+                    "is_valid": False,
+                    "issues": ["No answer generated"],
+                    "recommendation": "regenerate"
+                }
+                continue
+
+            # Reuse the verdict for this exact answer, query and sources
+            cached = self.cache.get(answer_key)
+            if cached is not None:
+                validations[i] = cached
+                self._log_validation(context, "validate_answer_cached", cached)
+            else:
+                pending.append(i)
+
+        if pending:
+            response = self.call_llm(
+                prompt=self.build_prompt(context, [answers[i] for i in pending]),
+                temperature=0.1,
+                response_format={"type": "json_object"}
+            )
+
+            returned = orjson.loads(response).get('validations', [])
+            by_index = {validation.get('index'): validation for validation in returned}
+
+            indexed = all(position in by_index for position in range(len(pending)))
+            if not indexed and (len(returned) == len(pending) or len(pending) == 1):
+                # Indices missing or numbered differently; match by position
+                by_index = dict(enumerate(returned))
+
+            for position, i in enumerate(pending):
+                validation = by_index.get(position)
+
+                if validation is None:
+                    # Don't cache a verdict the model never gave
+                    validations[i] = {
+                        "overall_quality": "poor",
+                        "is_valid": False,
+                        "issues": ["No validation returned"],
+                        "recommendation": "regenerate"
+                    }
+                    continue
+
+                validations[i] = validation
+                self.cache.add(answer_keys[i], validation)
+                self._log_validation(context, "validate_answer", validation)
+
+        return validations
+
+    def build_prompt(self, context: AgentContext, answers: List[str]) -> str:
+        """
+        Build a prompt validating one or more candidate answers
 
+        Args:
+            context: Agent context
+            answers: Candidate answers
+
+        Returns:
+            Validation prompt
+        """
         # Build source summary
         sources = context.graded_docs or []
         source_summary = "\n".join([
-            f"Source {i}: {doc['content'][:200]}..."
+            "Source %d: %s..." % (i, doc.get('preview') or doc['content'][:settings.preview_chars])
             for i, doc in enumerate(sources, 1)
         ])
 
-        prompt = f"""Validate this answer across multiple dimensions.
+        candidates = "\n\n".join(
+            f"[Answer {i}]\n{answer}" for i, answer in enumerate(answers)
+        )
+
+        return f"""Validate each generated answer across multiple dimensions.
 
 Query: "{context.query}"
 
 Sources Used:
 {source_summary if source_summary else "No sources (conversational response)"}
 
-Generated Answer:
-{answer}
+Generated Answers:
+{candidates}
 
-Evaluate:
+Evaluate each answer:
 1. GROUNDED: Is answer supported by sources? Any hallucinations?
 2. COMPLETE: Does it fully answer the question?
 3. USEFUL: Is it helpful to the user?
 4. ACCURATE: Are specific details (prices, dates, etc.) correct?
 5. CLARITY: Is it clear and well-organized?
 
-Respond in JSON:
+Respond in JSON with one entry per answer, using the answer's index:
 {{
-    "grounded": {{
-        "score": 0.0-1.0,
-        "is_acceptable": true/false,
-        "issues": ["list any unsupported claims"]
-    }},
-    "complete": {{
-        "score": 0.0-1.0,
-        "is_acceptable": true/false,
-        "missing": ["list missing information"]
-    }},
-    "useful": {{
-        "score": 0.0-1.0,
-        "is_acceptable": true/false,
-        "issues": ["list any usefulness issues"]
-    }},
-    "accurate": {{
-        "score": 0.0-1.0,
-        "is_acceptable": true/false,
-        "errors": ["list any inaccuracies"]
-    }},
-    "clarity": {{
-        "score": 0.0-1.0,
-        "is_acceptable": true/false,
-        "issues": ["list clarity issues"]
-    }},
-    "overall_quality": "excellent/good/acceptable/poor",
-    "is_valid": true/false,
-    "recommendation": "accept/regenerate/retrieve_more/clarify_query",
-    "reasoning": "overall assessment"
+    "validations": [
+        {{
+            "index": 0,
+            "grounded": {{
+                "score": 0.0-1.0,
+                "is_acceptable": true/false,
+                "issues": ["list any unsupported claims"]
+            }},
+            "complete": {{
+                "score": 0.0-1.0,
+                "is_acceptable": true/false,
+                "missing": ["list missing information"]
+            }},
+            "useful": {{
+                "score": 0.0-1.0,
+                "is_acceptable": true/false,
+                "issues": ["list any usefulness issues"]
+            }},
+            "accurate": {{
+                "score": 0.0-1.0,
+                "is_acceptable": true/false,
+                "errors": ["list any inaccuracies"]
+            }},
+            "clarity": {{
+                "score": 0.0-1.0,
+                "is_acceptable": true/false,
+                "issues": ["list clarity issues"]
+            }},
+            "overall_quality": "excellent/good/acceptable/poor",
+            "is_valid": true/false,
+            "recommendation": "accept/regenerate/retrieve_more/clarify_query",
+            "reasoning": "overall assessment"
+        }},
+        ...
+    ]
 }}"""
 
-        response = self.call_llm(
-            prompt=prompt,
-            temperature=0.1,
-            response_format={"type": "json_object"}
-        )
-
-        validation = json.loads(response)
-
-        # Log action
+    def _log_validation(
+        self,
+        context: AgentContext,
+        action: str,
+        validation: Dict[str, Any]
+    ):
+        """Log the headline of a validation result"""
         self.log_action(
             context,
-            "validate_answer",
+            action,
             {
                 "overall_quality": validation.get('overall_quality'),
                 "is_valid": validation.get('is_valid'),
@@ -111,11 +218,6 @@ Respond in JSON:
             }
         )
 
-        # Update context
-        context.validation_results = validation
-
-        return validation
-
 def main():
     """Test validation agent"""
     agent = ValidationAgent()
@@ -1,7 +1,10 @@
 """
 Configuration management for RAG systems
 """
+import logging
 import os
+import sys
+from functools import cached_property, lru_cache
 from pathlib import Path
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
@@ -26,25 +29,33 @@ class Settings(BaseSettings):
     # Retrieval Configuration
     default_top_k: int = 10
     rerank_top_k: int = 3
+    preview_chars: int = 200
 
     # Generation Configuration
     max_tokens: int = 1000
     temperature: float = 0.1
 
-    # Project Paths
-    @property
+    # Cache Configuration (exact-request LLM response cache; off by default
+    # because it makes retries and regenerations return the same sample)
+    llm_cache: bool = False
+
+    # Connection Configuration
+    llm_warmup: bool = True
+
+    # Project Paths (computed once per settings instance)
+    @cached_property
     def project_root(self) -> Path:
         return Path(__file__).parent.parent
 
-    @property
+    @cached_property
     def data_dir(self) -> Path:
         return self.project_root / "data"
 
-    @property
+    @cached_property
     def knowledge_base_dir(self) -> Path:
         return self.data_dir / "knowledge_base"
 
-    @property
+    @cached_property
     def vector_store_dir(self) -> Path:
         return self.project_root / self.vector_store_path
 
@@ -55,9 +66,22 @@ class Settings(BaseSettings):
 # Global settings instance
 settings = Settings()
 
+@lru_cache(maxsize=1)
 def get_openai_api_key() -> str:
-    """Get OpenAI API key from environment"""
+    """Get OpenAI API key from environment (validated on first successful call)"""
     api_key = settings.openai_api_key
     if not api_key:
         raise ValueError("OPENAI_API_KEY not found in environment variables")
     return api_key
+
+def set_verbose(verbose: bool):
+    """Show (or hide) the RAG pipelines' step-by-step logs on stdout"""
+    logger = logging.getLogger("src.rag")
+
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.propagate = False
+
+    logger.setLevel(logging.DEBUG if verbose else logging.WARNING)
@@ -1,13 +1,56 @@
 """
 Data loader for knowledge base documents
 """
-import json
+import mmap
 from pathlib import Path
-from typing import List, Dict, Any
+import orjson
+from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass
 from src.config import settings
 
-@dataclass
+# Knowledge base files larger than this are memory-mapped when loading
+MMAP_THRESHOLD_BYTES = 100 * 1024 * 1024
+
+# Document text templates: (line prefix, record field, default).
+# A default of None marks a required field.
+FieldSpec = Tuple[str, str, Optional[str]]
+
+PRODUCT_FIELDS: List[FieldSpec] = [
+    ("Product: ", "name", None),
+    ("Category: ", "category", None),
+    ("Price: $", "price", None),
+    ("Description: ", "description", None),
+    ("Specifications: ", "specifications", "N/A"),
+    ("Warranty: ", "warranty", "No warranty"),
+    ("Return Period: ", "return_period", "Standard return policy applies"),
+]
+
+POLICY_FIELDS: List[FieldSpec] = [
+    ("Policy: ", "title", None),
+    ("Category: ", "category", None),
+    ("Details: ", "content", None),
+]
+
+SHIPPING_FIELDS: List[FieldSpec] = [
+    ("Shipping Information: ", "title", None),
+    ("Category: ", "category", None),
+    ("Details: ", "content", None),
+]
+
+FAQ_FIELDS: List[FieldSpec] = [
+    ("Question: ", "question", None),
+    ("Category: ", "category", None),
+    ("Answer: ", "answer", None),
+]
+
+def render_fields(record: Dict[str, Any], fields: List[FieldSpec]) -> str:
+    """Render a knowledge base record as one "Label: value" line per field"""
+    return "\n".join(
+        f"{prefix}{record[key] if default is None else record.get(key, default)}"
+        for prefix, key, default in fields
+    )
+
+@dataclass(slots=True)
 class Document:
     """Document with content and metadata"""
     content: str
@@ -26,28 +69,23 @@ class KnowledgeBaseLoader:
 
     def load_json_file(self, file_path: Path) -> List[Dict]:
         """Load a JSON file"""
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        file_path = Path(file_path)
+
+        # Map very large files instead of reading them into memory
+        if file_path.stat().st_size > MMAP_THRESHOLD_BYTES:
+            with open(file_path, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    return orjson.loads(memoryview(mm))
+
+        return orjson.loads(file_path.read_bytes())
 
     def load_products(self) -> List[Document]:
         """Load product documents"""
         products = self.load_json_file(self.kb_dir / "products.json")
-        documents = []
-
-        for product in products:
-            # Create rich text representation
-            content = f"""
-Product: {product['name']}
-Category: {product['category']}
-Price: ${product['price']}
-Description: {product['description']}
-Specifications: {product.get('specifications', 'N/A')}
-Warranty: {product.get('warranty', 'No warranty')}
-Return Period: {product.get('return_period', 'Standard return policy applies')}
-            """.strip()
-
-            documents.append(Document(
-                content=content,
+
+        return [
+            Document(
+                content=render_fields(product, PRODUCT_FIELDS),
                 metadata={
                     'id': product['id'],
                     'category': product['category'],
@@ -56,24 +94,17 @@ Return Period: {product.get('return_period', 'Standard return policy applies')}
                     'price': product['price']
                 },
                 doc_id=product['id']
-            ))
-
-        return documents
+            )
+            for product in products
+        ]
 
     def load_policies(self) -> List[Document]:
         """Load policy documents"""
         policies = self.load_json_file(self.kb_dir / "policies.json")
-        documents = []
-
-        for policy in policies:
-            content = f"""
-Policy: {policy['title']}
-Category: {policy['category']}
-Details: {policy['content']}
-            """.strip()
 
-            documents.append(Document(
-                content=content,
+        return [
+            Document(
+                content=render_fields(policy, POLICY_FIELDS),
                 metadata={
                     'id': policy['id'],
                     'category': policy['category'],
@@ -81,24 +112,17 @@ Details: {policy['content']}
                     'title': policy['title']
                 },
                 doc_id=policy['id']
-            ))
-
-        return documents
+            )
+            for policy in policies
+        ]
 
     def load_shipping(self) -> List[Document]:
         """Load shipping documents"""
         shipping_docs = self.load_json_file(self.kb_dir / "shipping.json")
-        documents = []
-
-        for doc in shipping_docs:
-            content = f"""
-Shipping Information: {doc['title']}
-Category: {doc['category']}
-Details: {doc['content']}
-            """.strip()
 
-            documents.append(Document(
-                content=content,
+        return [
+            Document(
+                content=render_fields(doc, SHIPPING_FIELDS),
                 metadata={
                     'id': doc['id'],
                     'category': doc['category'],
@@ -106,24 +130,17 @@ Details: {doc['content']}
                     'title': doc['title']
                 },
                 doc_id=doc['id']
-            ))
-
-        return documents
+            )
+            for doc in shipping_docs
+        ]
 
     def load_faq(self) -> List[Document]:
         """Load FAQ documents"""
         faqs = self.load_json_file(self.kb_dir / "faq.json")
-        documents = []
 
-        for faq in faqs:
-            content = f"""
-Question: {faq['question']}
-Category: {faq['category']}
-Answer: {faq['answer']}
-            """.strip()
-
-            documents.append(Document(
-                content=content,
+        return [
+            Document(
+                content=render_fields(faq, FAQ_FIELDS),
                 metadata={
                     'id': faq['id'],
                     'category': faq['category'],
@@ -131,9 +148,9 @@ Answer: {faq['answer']}
                     'question': faq['question']
                 },
                 doc_id=faq['id']
-            ))
-
-        return documents
+            )
+            for faq in faqs
+        ]
 
     def load_all(self) -> List[Document]:
         """Load all knowledge base documents"""
@@ -1,16 +1,50 @@
 """
 Embedding generation using OpenAI
 """
-from typing import List
-from openai import OpenAI
+import atexit
+import functools
+from typing import Iterator, List, Union
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from openai import OpenAI, RateLimitError, APIConnectionError, APITimeoutError
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
 from src.config import settings, get_openai_api_key
 
+@functools.lru_cache(maxsize=1)
+def _get_client() -> OpenAI:
+    """Return the OpenAI client shared by all EmbeddingGenerator instances"""
+    client = OpenAI(
+        api_key=get_openai_api_key(),
+        # Retries are handled by tenacity in _create_embeddings
+        max_retries=0,
+        http_client=httpx.Client(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+            timeout=30.0
+        )
+    )
+    atexit.register(client.close)
+    return client
+
 class EmbeddingGenerator:
     """Generate embeddings using OpenAI API"""
 
     def __init__(self, model: str = None):
         self.model = model or settings.openai_embedding_model
-        self.client = OpenAI(api_key=get_openai_api_key())
+        self.client = _get_client()
+
+    @retry(
+        retry=retry_if_exception_type((RateLimitError, APIConnectionError, APITimeoutError)),
+        wait=wait_random_exponential(multiplier=0.5, max=20),
+        stop=stop_after_attempt(6),
+        reraise=True
+    )
+    def _create_embeddings(self, input: Union[str, List[str]]):
+        """Call the embeddings endpoint, backing off on rate limits"""
+        return self.client.embeddings.create(
+            input=input,
+            model=self.model
+        )
 
     def generate_embedding(self, text: str) -> List[float]:
         """Generate embedding for a single text"""
@@ -20,35 +54,79 @@ class EmbeddingGenerator:
         if not text:
             raise ValueError("Cannot generate embedding for empty text")
 
-        response = self.client.embeddings.create(
-            input=text,
-            model=self.model
-        )
+        response = self._create_embeddings(text)
 
         return response.data[0].embedding
 
     def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for multiple texts (batch processing)"""
+        """Generate embeddings for multiple texts in one request, in text order"""
         if not texts:
             return []
 
         # Clean texts
         cleaned_texts = [text.replace("\n", " ").strip() for text in texts]
 
-        # Filter empty texts
-        non_empty_texts = [t for t in cleaned_texts if t]
-
-        if not non_empty_texts:
-            raise ValueError("No non-empty texts to embed")
+        # Callers pair embeddings with texts by position, so an empty text
+        # cannot just be dropped
+        empty = [i for i, text in enumerate(cleaned_texts) if not text]
+        if empty:
+            raise ValueError(f"Cannot generate embedding for empty texts at {empty}")
 
         # OpenAI allows batch embedding requests
-        response = self.client.embeddings.create(
-            input=non_empty_texts,
-            model=self.model
-        )
+        response = self._create_embeddings(cleaned_texts)
 
         return [item.embedding for item in response.data]
 
+    def generate_embeddings_batched(
+        self,
+        texts: List[str],
+        batch_size: int = 512,
+        max_workers: int = 8
+    ) -> List[List[float]]:
+        """
+        Generate embeddings for many texts, one request per batch
+
+        Batches are sent concurrently; results keep the order of texts.
+
+        Args:
+            texts: Texts to embed
+            batch_size: Texts per embeddings request
+            max_workers: Maximum concurrent requests
+
+        Returns:
+            One embedding per text
+        """
+        return [
+            embedding
+            for batch in self.iter_embedding_batches(texts, batch_size, max_workers)
+            for embedding in batch
+        ]
+
+    def iter_embedding_batches(
+        self,
+        texts: List[str],
+        batch_size: int = 512,
+        max_workers: int = 8
+    ) -> Iterator[List[List[float]]]:
+        """
+        Embed texts in concurrent batches, yielding each batch in order
+
+        A consumer can store batch i while later batches are still being
+        embedded.
+
+        Args:
+            texts: Texts to embed
+            batch_size: Texts per embeddings request
+            max_workers: Maximum concurrent requests
+
+        Yields:
+            Embeddings of texts[i:i + batch_size], for i = 0, batch_size, ...
+        """
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            yield from executor.map(self.generate_embeddings, batches)
+
 def main():
     """Test embedding generation"""
     generator = EmbeddingGenerator()
@@ -4,15 +4,19 @@ Agentic RAG Implementation with Multi-Agent Decision Making
 Flow:
 1. Router Agent → Classify query
 2. Planning Agent → Create execution plan
-3. Execute plan with specialized agents:
+3. Execute plan with specialized agents (independent steps concurrently):
    - Retrieval Agent
    - Grading Agent
    - Generation Agent
 4. Validation Agent → Verify quality
 5. Adaptive actions based on validation
 """
-from typing import Dict, Any, List, Optional
-from src.agents.base_agent import AgentContext
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, Final, List, Optional, Tuple
+from openai import OpenAI
+from src.agents.base_agent import AgentContext, format_timestamp, get_openai_client
+from src.config import set_verbose
 from src.agents.router_agent import RouterAgent
 from src.agents.planning_agent import PlanningAgent
 from src.agents.retrieval_agent import RetrievalAgent
@@ -21,6 +25,23 @@ from src.agents.generation_agent import GenerationAgent
 from src.agents.validation_agent import ValidationAgent
 from src.vector_store import VectorStore
 from src.reranker import DocumentReranker
+from src.semantic_cache import SemanticCache, copy_result
+
+logger = logging.getLogger(__name__)
+
+# Runs independent plan steps; separate from LLM_EXECUTOR, which the steps
+# themselves use and could otherwise exhaust while waiting on each other
+PLAN_EXECUTOR = ThreadPoolExecutor(max_workers=4)
+
+_CONVERSATIONAL_RESPONSE: Final[str] = """Hello! I'm your customer support assistant. I can help you with:
+- Product information
+- Return and refund policies
+- Shipping information
+- Order tracking
+- Account questions
+- Technical support
+
+How can I assist you today?"""
 
 class AgenticRAG:
     """Agentic RAG with intelligent multi-agent orchestration"""
@@ -29,7 +50,9 @@ class AgenticRAG:
         self,
         vector_store: VectorStore,
         reranker: DocumentReranker = None,
-        max_iterations: int = 3
+        max_iterations: int = 3,
+        min_improvement: float = 0.05,
+        client: OpenAI = None
     ):
         """
         Initialize Agentic RAG
@@ -38,102 +61,192 @@ class AgenticRAG:
             vector_store: Vector store for retrieval
             reranker: Document reranker
             max_iterations: Maximum refinement iterations
+            min_improvement: Smallest gain in summed validation scores that
+                justifies another iteration
+            client: OpenAI client shared by all agents (defaults to the
+                process-wide pooled client)
         """
         self.vector_store = vector_store
         self.reranker = reranker or DocumentReranker()
         self.max_iterations = max_iterations
+        self.min_improvement = min_improvement
+        self.client = client or get_openai_client()
+
+        # Initialize agents on one connection pool
+        self.router = RouterAgent(client=self.client)
+        self.planner = PlanningAgent(client=self.client)
+        self.retrieval = RetrievalAgent(vector_store, self.reranker, client=self.client)
+        self.grading = GradingAgent(self.reranker, client=self.client)
+        self.generation = GenerationAgent(client=self.client)
+        self.validation = ValidationAgent(client=self.client)
+
+        # Full results for near-duplicate queries
+        self.answer_cache = SemanticCache(
+            embedder=vector_store.embedding_generator,
+            threshold=0.97,
+            ttl=3600
+        )
 
-        # Initialize agents
-        self.router = RouterAgent()
-        self.planner = PlanningAgent()
-        self.retrieval = RetrievalAgent(vector_store, reranker)
-        self.grading = GradingAgent()
-        self.generation = GenerationAgent()
-        self.validation = ValidationAgent()
-
-    def handle_conversational(
-        self,
-        context: AgentContext,
-        verbose: bool = False
-    ) -> str:
+    def handle_conversational(self, context: AgentContext) -> str:
         """
         Handle conversational queries without retrieval
 
         Args:
             context: Agent context
-            verbose: Print steps
 
         Returns:
             Response
         """
-        if verbose:
-            print("  → Conversational mode (no retrieval needed)")
-
-        response = """Hello! I'm your customer support assistant. I can help you with:
-- Product information
-- Return and refund policies
-- Shipping information
-- Order tracking
-- Account questions
-- Technical support
+        logger.debug("  → Conversational mode (no retrieval needed)")
 
-How can I assist you today?"""
+        context.generated_answer = _CONVERSATIONAL_RESPONSE
+        return _CONVERSATIONAL_RESPONSE
 
-        context.generated_answer = response
-        return response
-
-    def execute_plan(
-        self,
-        context: AgentContext,
-        verbose: bool = False
-    ) -> str:
+    def execute_plan(self, context: AgentContext) -> str:
         """
         Execute the planned steps
 
+        Steps run in dependency order; steps in the same wave (e.g. the
+        independent retrievals of a comparison) run concurrently, and
+        concurrent retrievals are fused once they all finish.
+
         Args:
             context: Agent context
-            verbose: Print steps
 
         Returns:
             Generated answer
         """
         plan = context.plan
 
-        if verbose:
-            print(f"\nExecuting {len(plan)} step plan:")
+        logger.debug("\nExecuting %s step plan:", len(plan))
+
+        for wave in self.schedule_plan(plan):
+            retrievals = [item for item in wave if item[1].get('action') == 'retrieve']
+
+            if len(retrievals) > 1:
+                # Search concurrently, then fuse the results on this thread
+                # so only one thread updates the context
+                results = list(PLAN_EXECUTOR.map(
+                    lambda item: self.retrieval.retrieve(context, item[1]),
+                    retrievals
+                ))
+                docs = self.retrieval.merge(context, results)
+                logger.debug(
+                    "\n  Steps %s: retrieve\n    Retrieved %s documents",
+                    ", ".join(str(i) for i, _ in retrievals),
+                    len(docs)
+                )
+                wave = [item for item in wave if item[1].get('action') != 'retrieve']
+
+            if len(wave) == 1:
+                self.execute_step(context, *wave[0])
+            elif wave:
+                list(PLAN_EXECUTOR.map(
+                    lambda item: self.execute_step(context, *item),
+                    wave
+                ))
+
+        return context.generated_answer
+
+    def schedule_plan(
+        self,
+        plan: List[Dict[str, Any]]
+    ) -> List[List[Tuple[int, Dict[str, Any]]]]:
+        """
+        Group plan steps into waves that can run concurrently
+
+        A step waits for the steps listed in its depends_on (by step number).
+        Without depends_on, leading retrieve steps are independent and any
+        other step waits for every step before it.
+
+        Args:
+            plan: Plan steps
+
+        Returns:
+            Waves of (position, step), in execution order
+        """
+        positions = {
+            step.get('step', i): i for i, step in enumerate(plan, 1)
+        }
+        levels: Dict[int, int] = {}
+        leading_retrieval = True
 
         for i, step in enumerate(plan, 1):
-            action = step.get('action')
+            leading_retrieval = leading_retrieval and step.get('action') == 'retrieve'
+
+            if 'depends_on' in step:
+                # Only earlier steps count, so a bad plan cannot form a cycle
+                deps = [
+                    positions[dep] for dep in step['depends_on']
+                    if positions.get(dep, i) < i
+                ]
+            elif leading_retrieval:
+                deps = []
+            else:
+                deps = range(1, i)
 
-            if verbose:
-                print(f"\n  Step {i}: {action}")
+            levels[i] = 1 + max((levels[dep] for dep in deps), default=0)
 
-            if action == 'retrieve':
-                docs = self.retrieval.execute(context, step)
-                if verbose:
-                    print(f"    Retrieved {len(docs)} documents")
+        waves: List[List[Tuple[int, Dict[str, Any]]]] = [
+            [] for _ in range(max(levels.values(), default=0))
+        ]
+        for i, step in enumerate(plan, 1):
+            waves[levels[i] - 1].append((i, step))
 
-            elif action == 'grade':
-                docs = self.grading.execute(context)
-                if verbose:
-                    print(f"    Graded: {len(docs)} relevant documents")
+        return waves
 
-            elif action in ['generate', 'compare', 'synthesize']:
-                answer = self.generation.execute(context, plan_step=step)
-                if verbose:
-                    print(f"    Generated answer ({len(answer)} chars)")
+    def execute_step(
+        self,
+        context: AgentContext,
+        i: int,
+        step: Dict[str, Any]
+    ) -> Any:
+        """
+        Execute a single plan step
+
+        Args:
+            context: Agent context
+            i: Step position in the plan
+            step: Plan step
 
+        Returns:
+            The step's output
+        """
+        action = step.get('action')
+
+        logger.debug("\n  Step %s: %s", i, action)
+
+        if action == 'retrieve':
+            docs = self.retrieval.execute(context, step)
+            logger.debug("    Retrieved %s documents", len(docs))
+            return docs
+
+        elif action == 'grade':
+            docs = self.grading.execute(context)
+            logger.debug("    Graded: %s relevant documents", len(docs))
+            return docs
+
+        elif action in ['generate', 'compare', 'synthesize']:
+            on_token = context.metadata.get('on_token')
+            if on_token is None:
+                answer = self.generation.execute(context, plan_step=step)
             else:
-                if verbose:
-                    print(f"    Skipping unknown action: {action}")
+                for chunk in self.generation.execute_stream(context, plan_step=step):
+                    on_token(chunk)
+                answer = context.generated_answer
+            logger.debug("    Generated answer (%s chars)", len(answer))
+            return answer
 
-        return context.generated_answer
+        else:
+            logger.debug("    Skipping unknown action: %s", action)
+            return None
 
     def query(
         self,
         query: str,
         conversation_history: List[Dict[str, str]] = None,
-        verbose: bool = False
+        verbose: bool = False,
+        on_token: Optional[Callable[[str], None]] = None
     ) -> Dict[str, Any]:
         """
         Execute Agentic RAG pipeline
@@ -141,46 +254,94 @@ How can I assist you today?"""
         Args:
             query: User query
             conversation_history: Previous conversation
-            verbose: Print detailed execution steps
+            verbose: Log detailed execution steps to stdout
+            on_token: Called with each answer chunk as it is generated;
+                regenerations stream again, and cached or canned answers
+                arrive as a single chunk
 
         Returns:
             Complete response with answer and metadata
         """
+        set_verbose(verbose)
+
         # Initialize context
         context = AgentContext(
             query=query,
             history=conversation_history or []
         )
+        if on_token is not None:
+            context.metadata['on_token'] = on_token
+
+        logger.debug(
+            "\n%s\n"
+            "AGENTIC RAG PIPELINE\n"
+            "%s\n\n"
+            "Query: %s\n",
+            '='*70,
+            '='*70,
+            query
+        )
 
-        if verbose:
-            print(f"\n{'='*70}")
-            print("AGENTIC RAG PIPELINE")
-            print(f"{'='*70}\n")
-            print(f"Query: {query}\n")
+        # Answers depend on the conversation, so only cache fresh ones
+        use_cache = not context.history
+        if use_cache:
+            query_vector = self.answer_cache.embed(query)
+            context.metadata['query_vector'] = query_vector
+            cached = self.answer_cache.get(query_vector)
 
-        # Step 1: Route query
-        if verbose:
-            print("Agent: Router")
-            print("Action: Classifying query and determining strategy...")
+            if cached is not None:
+                logger.debug("Answer cache hit\n")
+                if on_token is not None:
+                    on_token(cached['answer'])
+                return {**copy_result(cached), 'cached': True}
 
-        route_info = self.router.execute(context)
+        # Step 1: Route query
+        logger.debug(
+            "Agent: Router\n"
+            "Action: Classifying query and determining strategy..."
+        )
 
-        if verbose:
-            print(f"  Category: {route_info['category']}")
-            print(f"  Complexity: {route_info['complexity']}")
-            print(f"  Requires Retrieval: {route_info['requires_retrieval']}")
-            print(f"  Strategy: {route_info['suggested_strategy']}")
+        # Search for the raw query while the router classifies it; most
+        # queries need retrieval and the direct plans search for exactly this
+        self.retrieval.prefetch(context)
+
+        def on_route_field(key: str, value: Any):
+            # Free the prefetch as soon as the router rules out retrieval
+            if key == 'requires_retrieval' and not value:
+                self.retrieval.discard_prefetch(context)
+
+        route_info = self.router.execute(context, on_field=on_route_field)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "  Category: %s\n"
+                "  Complexity: %s\n"
+                "  Requires Retrieval: %s\n"
+                "  Strategy: %s",
+                route_info['category'],
+                route_info['complexity'],
+                route_info['requires_retrieval'],
+                route_info['suggested_strategy']
+            )
 
         # Step 2: Handle conversational queries
         if not route_info['requires_retrieval']:
-            answer = self.handle_conversational(context, verbose)
-
-            if verbose:
-                print(f"\n{'='*70}")
-                print("FINAL ANSWER:")
-                print(f"{'='*70}")
-                print(answer)
-                print(f"{'='*70}\n")
+            self.retrieval.discard_prefetch(context)
+            answer = self.handle_conversational(context)
+            if on_token is not None:
+                on_token(answer)
+
+            logger.debug(
+                "\n%s\n"
+                "FINAL ANSWER:\n"
+                "%s\n"
+                "%s\n"
+                "%s\n",
+                '='*70,
+                '='*70,
+                answer,
+                '='*70
+            )
 
             return {
                 'answer': answer,
@@ -190,51 +351,67 @@ How can I assist you today?"""
             }
 
         # Step 3: Plan execution
-        if verbose:
-            print(f"\nAgent: Planner")
-            print("Action: Creating execution plan...")
+        logger.debug(
+            "\nAgent: Planner\n"
+            "Action: Creating execution plan..."
+        )
 
         plan = self.planner.execute(context)
 
-        if verbose:
-            print(f"  Plan type: {context.metadata.get('plan_type', 'standard')}")
-            print(f"  Steps: {len(plan)}")
+        logger.debug(
+            "  Plan type: %s\n"
+            "  Steps: %s",
+            context.metadata.get('plan_type', 'standard'),
+            len(plan)
+        )
 
         # Iterative refinement loop
         best_answer = None
         best_validation = None
+        prev_score = 0.0
         iteration = 0
 
         while iteration < self.max_iterations:
             iteration += 1
 
-            if verbose:
-                print(f"\n{'─'*70}")
-                print(f"ITERATION {iteration}")
-                print(f"{'─'*70}")
+            # Later iterations want a new answer, not a cached response
+            context.metadata['regenerate'] = iteration > 1
+
+            logger.debug(
+                "\n%s\n"
+                "ITERATION %s\n"
+                "%s",
+                '─'*70,
+                iteration,
+                '─'*70
+            )
 
             # Step 4: Execute plan
-            if verbose:
-                print("\nPhase: Execution")
+            logger.debug("\nPhase: Execution")
 
-            answer = self.execute_plan(context, verbose)
+            answer = self.execute_plan(context)
 
             if not answer:
-                if verbose:
-                    print("  ⚠ No answer generated")
+                logger.debug("  ⚠ No answer generated")
                 break
 
             # Step 5: Validate answer
-            if verbose:
-                print(f"\nAgent: Validator")
-                print("Action: Validating answer quality...")
+            logger.debug(
+                "\nAgent: Validator\n"
+                "Action: Validating answer quality..."
+            )
 
             validation = self.validation.execute(context, answer)
 
-            if verbose:
-                print(f"  Quality: {validation['overall_quality']}")
-                print(f"  Valid: {validation['is_valid']}")
-                print(f"  Recommendation: {validation['recommendation']}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "  Quality: %s\n"
+                    "  Valid: %s\n"
+                    "  Recommendation: %s",
+                    validation['overall_quality'],
+                    validation['is_valid'],
+                    validation['recommendation']
+                )
 
             # Track best answer
             if best_validation is None or validation['is_valid']:
@@ -245,13 +422,23 @@ How can I assist you today?"""
             recommendation = validation['recommendation']
 
             if recommendation == 'accept' or validation['is_valid']:
-                if verbose:
-                    print(f"\n  ✓ Answer accepted (iteration {iteration})")
+                logger.debug("\n  ✓ Answer accepted (iteration %s)", iteration)
+                break
+
+            # Stop once another round is unlikely to help
+            score = self._quality_score(validation)
+            if iteration >= 2 and score - prev_score < self.min_improvement:
+                logger.debug("\n  → Quality plateaued, using best available answer")
+                break
+            prev_score = score
+
+            if validation.get('overall_quality') in ['excellent', 'good'] and \
+               recommendation != 'retrieve_more':
+                logger.debug("\n  ✓ Answer is good enough (iteration %s)", iteration)
                 break
 
             elif recommendation == 'retrieve_more':
-                if verbose:
-                    print(f"\n  → Retrieving additional context...")
+                logger.debug("\n  → Retrieving additional context...")
 
                 # Retrieve more with expanded query
                 additional_docs = self.retrieval.execute(
@@ -259,37 +446,45 @@ How can I assist you today?"""
                     plan_step={'action': 'retrieve', 'target': query}
                 )
 
-                # Merge with existing docs (deduplicated in retrieval agent)
-                if verbose:
-                    print(f"    Added {len(additional_docs)} more documents")
+                # Fused with earlier rankings (RRF) in the retrieval agent
+                logger.debug("    Added %s more documents", len(additional_docs))
 
             elif recommendation == 'regenerate':
-                if verbose:
-                    print(f"\n  ↻ Regenerating answer...")
+                logger.debug("\n  ↻ Regenerating answer...")
                 # Will regenerate in next iteration
                 continue
 
             else:
                 # Other recommendations or reached max iterations
-                if verbose:
-                    print(f"\n  → Using best available answer")
+                logger.debug("\n  → Using best available answer")
                 break
 
+        # The plan may never have searched for the raw query
+        self.retrieval.discard_prefetch(context)
+
         # Use best answer
         final_answer = best_answer or context.generated_answer
         final_validation = best_validation or context.validation_results
 
-        if verbose:
-            print(f"\n{'='*70}")
-            print("FINAL ANSWER:")
-            print(f"{'='*70}")
-            print(final_answer)
-            print(f"\nQuality: {final_validation.get('overall_quality', 'N/A')}")
-            print(f"Iterations: {iteration}")
-            print(f"Sources: {len(context.graded_docs)}")
-            print(f"{'='*70}\n")
-
-        return {
+        logger.debug(
+            "\n%s\n"
+            "FINAL ANSWER:\n"
+            "%s\n"
+            "%s\n"
+            "\nQuality: %s\n"
+            "Iterations: %s\n"
+            "Sources: %s\n"
+            "%s\n",
+            '='*70,
+            '='*70,
+            final_answer,
+            final_validation.get('overall_quality', 'N/A'),
+            iteration,
+            len(context.graded_docs),
+            '='*70
+        )
+
+        result = {
             'answer': final_answer,
             'validation': final_validation,
             'route_info': route_info,
@@ -299,6 +494,22 @@ How can I assist you today?"""
             'trace': context.execution_trace
         }
 
+        # Only cache answers validation accepted; a rejected one should be
+        # retried, not served again
+        accepted = final_validation.get('is_valid') or \
+            final_validation.get('overall_quality') in ['excellent', 'good']
+        if use_cache and accepted:
+            self.answer_cache.add(query_vector, copy_result(result))
+
+        return result
+
+    def _quality_score(self, validation: Dict[str, Any]) -> float:
+        """Sum of the grounded, useful and complete scores"""
+        return sum(
+            validation.get(dimension, {}).get('score', 0.0)
+            for dimension in ('grounded', 'useful', 'complete')
+        )
+
     def print_trace(self, result: Dict[str, Any]):
         """
         Print execution trace
@@ -311,7 +522,7 @@ How can I assist you today?"""
         print(f"{'='*70}")
 
         for entry in result.get('trace', []):
-            print(f"[{entry['timestamp']}]")
+            print(f"[{format_timestamp(entry['ts_ns'])}]")
             print(f"  Agent: {entry['agent']}")
             print(f"  Action: {entry['action']}")
             print(f"  Result: {entry['result']}")
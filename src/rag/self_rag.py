@@ -2,7 +2,7 @@
 Self RAG Implementation with Self-Checking and Self-Improvement
 
 Flow:
-1. Query → Retrieval Decision
+1. Query → Retrieval Decision (or direct answer, in the same LLM call)
 2. Retrieval (if needed) → Documents
 3. Relevance Grading → Filter documents
 4. Generation → Initial answer
@@ -15,12 +15,209 @@ Flow:
    - If needs improvement → Regenerate
    - If needs more context → Retrieve again
 """
-import json
-from typing import List, Dict, Any, Optional, Tuple
+from collections import deque
+import functools
+import orjson
+import logging
+import re
+import threading
+from typing import List, Dict, Any, Final, Iterator, Optional, Tuple
 from openai import OpenAI
-from src.config import settings, get_openai_api_key
+from src.config import settings, set_verbose
+from src.agents.base_agent import LLM_EXECUTOR, MAX_TRACE_ENTRIES, get_openai_client
 from src.vector_store import VectorStore
-from src.reranker import DocumentReranker
+from src.reranker import DocumentReranker, drop_near_duplicates, reciprocal_rank_fusion
+from src.semantic_cache import QueryCache, SemanticCache, copy_result
+
+logger = logging.getLogger(__name__)
+
+# Characters of each document shown to the grader
+GRADE_SNIPPET_CHARS = 500
+
+# Lets the first LLM call either request retrieval or answer directly
+RETRIEVE_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "retrieve_docs",
+        "description": "Search the customer support knowledge base (products, policies, shipping, FAQs). Call this for any question that needs specific store information; answer greetings and small talk directly.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "search_query": {
+                    "type": "string",
+                    "description": "Focused search phrase for the knowledge base"
+                }
+            },
+            "required": ["search_query"]
+        }
+    }
+}
+
+# Prompts are formatted with str.format; literal braces are doubled
+SHOULD_RETRIEVE_PROMPT: Final[str] = """Analyze this customer query and determine if external knowledge retrieval is needed.
+
+Query: "{query}"
+
+Some queries can be answered with general knowledge or are just greetings/small talk.
+Others require specific information from our knowledge base.
+
+Respond in JSON format:
+{{
+    "needs_retrieval": true/false,
+    "reasoning": "explanation",
+    "query_type": "product_question/policy_question/greeting/general_conversation/technical_support"
+}}"""
+
+GRADE_PROMPT: Final[str] = """Grade the relevance of this document to the query.
+
+Query: "{query}"
+
+Document:
+{snippet}
+
+Is this document relevant to answering the query?
+Respond in JSON format:
+{{
+    "is_relevant": true/false,
+    "relevance_score": 0.0-1.0,
+    "reasoning": "brief explanation"
+}}"""
+
+# GRADE_PROMPT split around the snippet: the head is formatted once per
+# query, the tail (only escaped braces) once at import
+_GRADE_HEAD, _GRADE_TAIL = GRADE_PROMPT.split("{snippet}")
+_GRADE_TAIL = _GRADE_TAIL.format()
+
+GRADE_BATCH_PROMPT: Final[str] = """Grade the relevance of each document to the query.
+
+Query: "{query}"
+
+Documents:
+{doc_blocks}
+
+Is each document relevant to answering the query?
+Respond in JSON format with one entry per document, using the document's index:
+{{
+    "grades": [
+        {{
+            "index": 0,
+            "is_relevant": true/false,
+            "relevance_score": 0.0-1.0,
+            "reasoning": "brief explanation"
+        }},
+        ...
+    ]
+}}"""
+
+SYSTEM_GROUNDED: Final[str] = """You are a customer support assistant. Answer based on the provided context.
+
+Guidelines:
+- Use only information from context
+- Cite sources using [Source N]
+- Be accurate and specific
+- If context is insufficient, say so clearly"""
+
+ANSWER_PROMPT: Final[str] = """Context:
+{context}
+
+Question: {query}
+
+Answer:"""
+
+EVALUATE_PROMPT: Final[str] = """Evaluate this answer across three dimensions:
+
+Query: "{query}"
+
+Context Sources:
+{context_summary}
+
+Generated Answer:
+{answer}
+
+Evaluate:
+1. GROUNDED: Is the answer supported by the context sources? Are there any unsupported claims?
+2. USEFUL: Does the answer actually address the user's question?
+3. COMPLETE: Is the answer complete or is important information missing?
+
+Respond in JSON format:
+{{
+    "grounded": {{
+        "score": 0.0-1.0,
+        "is_acceptable": true/false,
+        "issues": ["list of unsupported claims if any"]
+    }},
+    "useful": {{
+        "score": 0.0-1.0,
+        "is_acceptable": true/false,
+        "issues": ["list of issues if any"]
+    }},
+    "complete": {{
+        "score": 0.0-1.0,
+        "is_acceptable": true/false,
+        "missing": ["list of missing information if any"]
+    }},
+    "overall_quality": "excellent/good/needs_improvement/poor",
+    "recommendation": "accept/regenerate/retrieve_more/rewrite_query"
+}}"""
+
+RESPONSE_FORMAT_JSON: Final[Dict[str, str]] = {"type": "json_object"}
+
+@functools.lru_cache(maxsize=256)
+def _join_sources(previews: Tuple[str, ...]) -> str:
+    """Number source previews, one per line (memoized per source set)"""
+    return "\n".join([
+        "Source %d: %s..." % (i, preview)
+        for i, preview in enumerate(previews, 1)
+    ])
+
+_CITATION = re.compile(r"\[Source (\d+)\]")
+
+# Phrases that mean the answer gave up or hedged on missing context
+_UNSURE_PHRASES = (
+    "i don't know",
+    "i do not know",
+    "not sure",
+    "cannot find",
+    "can't find",
+    "no information",
+    "does not contain",
+    "doesn't contain",
+    "insufficient"
+)
+
+def _cheap_eval(answer: str, context_docs: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Accept an answer without an LLM call when it is clearly grounded
+
+    Args:
+        answer: Generated answer
+        context_docs: Context documents the answer may cite
+
+    Returns:
+        Evaluation that accepts the answer, or None to evaluate with the LLM
+    """
+    if not context_docs or not 100 <= len(answer) <= 2000:
+        return None
+
+    cited = {
+        int(n) for n in _CITATION.findall(answer)
+        if 1 <= int(n) <= len(context_docs)
+    }
+    if len(cited) < min(len(context_docs), 2):
+        return None
+
+    lowered = answer.lower()
+    if any(phrase in lowered for phrase in _UNSURE_PHRASES):
+        return None
+
+    return {
+        "grounded": {"score": 0.8, "is_acceptable": True, "issues": []},
+        "useful": {"score": 0.8, "is_acceptable": True, "issues": []},
+        "complete": {"score": 0.8, "is_acceptable": True, "missing": []},
+        "overall_quality": "good",
+        "recommendation": "accept",
+        "heuristic": True
+    }
 
 class SelfRAG:
     """Self RAG with self-checking and adaptive retrieval"""
@@ -30,7 +227,12 @@ class SelfRAG:
         vector_store: VectorStore,
         reranker: DocumentReranker = None,
         model: str = None,
-        max_iterations: int = 3
+        max_iterations: int = 3,
+        grade_batch_size: int = 15,
+        independent_grading: bool = False,
+        max_concurrent_grades: int = 8,
+        min_improvement: float = 0.05,
+        client: OpenAI = None
     ):
         """
         Initialize Self RAG
@@ -40,13 +242,35 @@ class SelfRAG:
             reranker: Document reranker
             model: OpenAI model name
             max_iterations: Maximum self-improvement iterations
+            grade_batch_size: Documents graded per LLM call
+            independent_grading: Grade each document in its own LLM call
+                (run concurrently) instead of in batches
+            max_concurrent_grades: Concurrent calls when grading independently
+            min_improvement: Smallest gain in summed evaluation scores that
+                justifies another iteration
+            client: OpenAI client (defaults to the process-wide pooled client)
         """
         self.vector_store = vector_store
         self.reranker = reranker or DocumentReranker()
         self.model = model or settings.openai_chat_model
         self.max_iterations = max_iterations
-
-        self.client = OpenAI(api_key=get_openai_api_key())
+        self.grade_batch_size = grade_batch_size
+        self.independent_grading = independent_grading
+        self.max_concurrent_grades = max_concurrent_grades
+        self._grade_slots = threading.BoundedSemaphore(max_concurrent_grades)
+        self.min_improvement = min_improvement
+
+        self.client = client or get_openai_client()
+
+        # Retrieval decisions (and direct answers) for repeat queries
+        self.decision_cache = QueryCache(max_size=1024)
+
+        # Full results for near-duplicate queries
+        self.answer_cache = SemanticCache(
+            embedder=vector_store.embedding_generator,
+            threshold=0.97,
+            ttl=3600
+        )
 
     def should_retrieve(self, query: str) -> Dict[str, Any]:
         """
@@ -58,30 +282,73 @@ class SelfRAG:
         Returns:
             Decision with reasoning
         """
-        prompt = f"""Analyze this customer query and determine if external knowledge retrieval is needed.
-
-Query: "{query}"
-
-Some queries can be answered with general knowledge or are just greetings/small talk.
-Others require specific information from our knowledge base.
-
-Respond in JSON format:
-{{
-    "needs_retrieval": true/false,
-    "reasoning": "explanation",
-    "query_type": "product_question/policy_question/greeting/general_conversation/technical_support"
-}}"""
+        prompt = SHOULD_RETRIEVE_PROMPT.format(query=query)
 
         response = self.client.chat.completions.create(
             model=settings.openai_fast_model,  # Use faster model for decision
             messages=[{"role": "user", "content": prompt}],
             temperature=0.1,
-            response_format={"type": "json_object"}
+            response_format=RESPONSE_FORMAT_JSON
         )
 
-        result = json.loads(response.choices[0].message.content)
+        result = orjson.loads(response.choices[0].message.content)
         return result
 
+    def decide_and_answer(self, query: str) -> Tuple[Dict[str, Any], Optional[str]]:
+        """
+        Decide on retrieval and answer non-retrieval queries in one call
+
+        The model either calls the retrieve_docs tool or answers directly,
+        which saves the separate should_retrieve round trip.
+
+        Args:
+            query: User query
+
+        Returns:
+            Retrieval decision, and the direct answer when no retrieval is needed
+        """
+        cached = self.decision_cache.get(query)
+        if cached is not None:
+            return cached
+
+        result = self._decide_and_answer(query)
+        self.decision_cache.add(query, result)
+        return result
+
+    def _decide_and_answer(self, query: str) -> Tuple[Dict[str, Any], Optional[str]]:
+        """Uncached decide_and_answer"""
+        response = self.client.chat.completions.create(
+            model=settings.openai_fast_model,
+            messages=[
+                {"role": "system", "content": "You are a helpful customer support assistant."},
+                {"role": "user", "content": query}
+            ],
+            tools=[RETRIEVE_TOOL],
+            temperature=0.1,
+            max_tokens=settings.max_tokens
+        )
+
+        message = response.choices[0].message
+
+        if message.tool_calls:
+            arguments = orjson.loads(message.tool_calls[0].function.arguments)
+            decision = {
+                "needs_retrieval": True,
+                "reasoning": "Model requested knowledge base retrieval",
+                "search_query": arguments.get("search_query") or query
+            }
+            return decision, None
+
+        if message.content:
+            decision = {
+                "needs_retrieval": False,
+                "reasoning": "Model answered directly"
+            }
+            return decision, message.content
+
+        # Neither a tool call nor an answer; decide the slow way
+        return self.should_retrieve(query), None
+
     def grade_documents(
         self,
         query: str,
@@ -90,6 +357,10 @@ Respond in JSON format:
         """
         Grade each document for relevance to query
 
+        Near-duplicate documents are dropped first. The rest are graded in
+        batches of grade_batch_size, one LLM call per batch, or one
+        concurrent call each with independent_grading.
+
         Args:
             query: User query
             documents: Retrieved documents
@@ -97,33 +368,23 @@ Respond in JSON format:
         Returns:
             Filtered list of relevant documents
         """
-        relevant_docs = []
-
-        for doc in documents:
-            prompt = f"""Grade the relevance of this document to the query.
-
-Query: "{query}"
+        # Keep the better-ranked copy of near-identical snippets
+        documents = drop_near_duplicates(documents)
 
-Document:
-{doc['content'][:500]}
-
-Is this document relevant to answering the query?
-Respond in JSON format:
-{{
-    "is_relevant": true/false,
-    "relevance_score": 0.0-1.0,
-    "reasoning": "brief explanation"
-}}"""
-
-            response = self.client.chat.completions.create(
-                model=settings.openai_fast_model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.1,
-                response_format={"type": "json_object"}
-            )
+        if self.independent_grading:
+            gradings = self.grade_each(query, documents)
+        else:
+            gradings = [
+                grading
+                for start in range(0, len(documents), self.grade_batch_size)
+                for grading in self.grade_batch(
+                    query, documents[start:start + self.grade_batch_size]
+                )
+            ]
 
-            grading = json.loads(response.choices[0].message.content)
+        relevant_docs = []
 
+        for doc, grading in zip(documents, gradings):
             # Add grading to document
             doc['grading'] = grading
 
@@ -133,6 +394,83 @@ Respond in JSON format:
 
         return relevant_docs
 
+    def grade_each(
+        self,
+        query: str,
+        documents: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Grade each document in its own LLM call, concurrently
+
+        The calls run on the shared LLM_EXECUTOR through self.client, at
+        most max_concurrent_grades at a time.
+
+        Args:
+            query: User query
+            documents: Documents to grade
+
+        Returns:
+            One grading per document, in input order
+        """
+        # Everything but the snippet is the same for every document
+        grade_head = _GRADE_HEAD.format(query=query)
+
+        def grade_one(doc: Dict[str, Any]) -> Dict[str, Any]:
+            prompt = grade_head + doc['content'][:GRADE_SNIPPET_CHARS] + _GRADE_TAIL
+
+            with self._grade_slots:
+                response = self.client.chat.completions.create(
+                    model=settings.openai_fast_model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0.1,
+                    response_format=RESPONSE_FORMAT_JSON
+                )
+
+            return orjson.loads(response.choices[0].message.content)
+
+        return list(LLM_EXECUTOR.map(grade_one, documents))
+
+    def grade_batch(
+        self,
+        query: str,
+        documents: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Grade several documents in a single LLM call
+
+        Args:
+            query: User query
+            documents: Documents to grade
+
+        Returns:
+            One grading per document, in input order
+        """
+        doc_blocks = "\n\n".join(
+            f"[Doc {i}]\n{doc['content'][:GRADE_SNIPPET_CHARS]}"
+            for i, doc in enumerate(documents)
+        )
+
+        prompt = GRADE_BATCH_PROMPT.format(query=query, doc_blocks=doc_blocks)
+
+        response = self.client.chat.completions.create(
+            model=settings.openai_fast_model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.1,
+            response_format=RESPONSE_FORMAT_JSON
+        )
+
+        result = orjson.loads(response.choices[0].message.content)
+        by_index = {grade.get('index'): grade for grade in result.get('grades', [])}
+
+        return [
+            by_index.get(i, {
+                "is_relevant": False,
+                "relevance_score": 0.0,
+                "reasoning": "No grade returned"
+            })
+            for i in range(len(documents))
+        ]
+
     def generate_answer(
         self,
         query: str,
@@ -148,6 +486,23 @@ Respond in JSON format:
         Returns:
             Generated answer
         """
+        return "".join(self.generate_answer_stream(query, context_docs))
+
+    def generate_answer_stream(
+        self,
+        query: str,
+        context_docs: List[Dict[str, Any]]
+    ) -> Iterator[str]:
+        """
+        Generate answer from context documents, incrementally
+
+        Args:
+            query: User query
+            context_docs: Context documents
+
+        Yields:
+            Answer content deltas as they arrive
+        """
         if not context_docs:
             # No context - general response
             system_prompt = "You are a helpful customer support assistant."
@@ -162,38 +517,48 @@ Respond in JSON format:
 
             context = "\n".join(context_parts)
 
-            system_prompt = """You are a customer support assistant. Answer based on the provided context.
+            system_prompt = SYSTEM_GROUNDED
 
-Guidelines:
-- Use only information from context
-- Cite sources using [Source N]
-- Be accurate and specific
-- If context is insufficient, say so clearly"""
+            user_prompt = ANSWER_PROMPT.format(context=context, query=query)
 
-            user_prompt = f"""Context:
-{context}
-
-Question: {query}
-
-Answer:"""
-
-        response = self.client.chat.completions.create(
+        stream = self.client.chat.completions.create(
             model=self.model,
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
             ],
             temperature=settings.temperature,
-            max_tokens=settings.max_tokens
+            max_tokens=settings.max_tokens,
+            stream=True
         )
 
-        return response.choices[0].message.content
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+
+    def build_context_summary(self, context_docs: List[Dict[str, Any]]) -> str:
+        """
+        Summarize context documents for the evaluation prompt
+
+        Args:
+            context_docs: Context documents
+
+        Returns:
+            One "Source N: preview..." line per document
+        """
+        return _join_sources(tuple(
+            doc['content'][:settings.preview_chars] for doc in context_docs
+        ))
 
     def evaluate_answer(
         self,
         query: str,
         answer: str,
-        context_docs: List[Dict[str, Any]]
+        context_docs: List[Dict[str, Any]],
+        precomputed_summary: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Self-evaluate the generated answer
@@ -202,157 +567,189 @@ Answer:"""
             query: Original query
             answer: Generated answer
             context_docs: Context documents used
+            precomputed_summary: build_context_summary(context_docs), if the
+                caller already has it
 
         Returns:
             Evaluation results
         """
-        # Build context summary
-        context_summary = "\n".join([
-            f"Source {i}: {doc['content'][:200]}..."
-            for i, doc in enumerate(context_docs, 1)
-        ])
-
-        prompt = f"""Evaluate this answer across three dimensions:
-
-Query: "{query}"
-
-Context Sources:
-{context_summary}
-
-Generated Answer:
-{answer}
-
-Evaluate:
-1. GROUNDED: Is the answer supported by the context sources? Are there any unsupported claims?
-2. USEFUL: Does the answer actually address the user's question?
-3. COMPLETE: Is the answer complete or is important information missing?
-
-Respond in JSON format:
-{{
-    "grounded": {{
-        "score": 0.0-1.0,
-        "is_acceptable": true/false,
-        "issues": ["list of unsupported claims if any"]
-    }},
-    "useful": {{
-        "score": 0.0-1.0,
-        "is_acceptable": true/false,
-        "issues": ["list of issues if any"]
-    }},
-    "complete": {{
-        "score": 0.0-1.0,
-        "is_acceptable": true/false,
-        "missing": ["list of missing information if any"]
-    }},
-    "overall_quality": "excellent/good/needs_improvement/poor",
-    "recommendation": "accept/regenerate/retrieve_more/rewrite_query"
-}}"""
+        context_summary = precomputed_summary
+        if context_summary is None:
+            context_summary = self.build_context_summary(context_docs)
+
+        prompt = EVALUATE_PROMPT.format(
+            query=query,
+            context_summary=context_summary,
+            answer=answer
+        )
 
         response = self.client.chat.completions.create(
             model=settings.openai_fast_model,
             messages=[{"role": "user", "content": prompt}],
             temperature=0.1,
-            response_format={"type": "json_object"}
+            response_format=RESPONSE_FORMAT_JSON
         )
 
-        evaluation = json.loads(response.choices[0].message.content)
+        evaluation = orjson.loads(response.choices[0].message.content)
         return evaluation
 
+    def _quality_score(self, evaluation: Dict[str, Any]) -> float:
+        """Sum of the grounded, useful and complete scores"""
+        return sum(
+            evaluation.get(dimension, {}).get('score', 0.0)
+            for dimension in ('grounded', 'useful', 'complete')
+        )
+
     def query(self, query: str, verbose: bool = False) -> Dict[str, Any]:
         """
         Execute Self RAG with iterative improvement
 
         Args:
             query: User query
-            verbose: Print detailed steps
+            verbose: Log detailed steps to stdout
 
         Returns:
             Final answer with execution trace
         """
-        trace = []
+        set_verbose(verbose)
+        trace = deque(maxlen=MAX_TRACE_ENTRIES)
+
+        logger.debug(
+            "\n%s\n"
+            "SELF RAG PIPELINE\n"
+            "%s\n\n"
+            "Query: %s\n",
+            '='*60,
+            '='*60,
+            query
+        )
 
-        if verbose:
-            print(f"\n{'='*60}")
-            print("SELF RAG PIPELINE")
-            print(f"{'='*60}\n")
-            print(f"Query: {query}\n")
+        query_vector = self.answer_cache.embed(query)
+        cached = self.answer_cache.get(query_vector)
+
+        if cached is not None:
+            logger.debug("Answer cache hit\n")
+            return {**copy_result(cached), 'cached': True}
 
         # Step 1: Decide if retrieval is needed
-        if verbose:
-            print("Step 1: Determining if retrieval is needed...")
+        logger.debug("Step 1: Determining if retrieval is needed...")
 
-        retrieval_decision = self.should_retrieve(query)
+        retrieval_decision, direct_answer = self.decide_and_answer(query)
         trace.append({"step": "retrieval_decision", "result": retrieval_decision})
 
-        if verbose:
-            print(f"  Needs retrieval: {retrieval_decision['needs_retrieval']}")
-            print(f"  Reasoning: {retrieval_decision['reasoning']}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "  Needs retrieval: %s\n"
+                "  Reasoning: %s",
+                retrieval_decision['needs_retrieval'],
+                retrieval_decision['reasoning']
+            )
 
         context_docs = []
 
         if retrieval_decision['needs_retrieval']:
             # Step 2: Retrieve documents
-            if verbose:
-                print(f"\nStep 2: Retrieving documents...")
+            logger.debug("\nStep 2: Retrieving documents...")
 
-            retrieved_docs = self.vector_store.search(query, top_k=10)
+            search_query = retrieval_decision.get('search_query', query)
+            if search_query == query:
+                retrieved_docs = self.vector_store.search_by_vector(
+                    query_vector.tolist(), top_k=10
+                )
+            else:
+                retrieved_docs = self.vector_store.search(search_query, top_k=10)
             trace.append({"step": "retrieval", "num_docs": len(retrieved_docs)})
 
-            if verbose:
-                print(f"  Retrieved {len(retrieved_docs)} documents")
+            logger.debug("  Retrieved %s documents", len(retrieved_docs))
 
             # Step 3: Grade documents
-            if verbose:
-                print(f"\nStep 3: Grading document relevance...")
+            logger.debug("\nStep 3: Grading document relevance...")
 
             context_docs = self.grade_documents(query, retrieved_docs)
             trace.append({"step": "grading", "relevant_docs": len(context_docs)})
 
-            if verbose:
-                print(f"  {len(context_docs)} documents are relevant")
+            logger.debug("  %s documents are relevant", len(context_docs))
 
             # Rerank relevant documents
             if context_docs:
                 context_docs = self.reranker.rerank(query, context_docs, top_k=3)
 
+        # Rankings merged with RRF when more context is retrieved
+        retrieval_history = [context_docs]
+
+        # Sources only change on retrieve_more, so summarize them once per
+        # source set (built while the answer streams in)
+        context_summary = None
+
         # Self-improvement loop
         best_answer = None
         best_evaluation = None
+        prev_score = 0.0
         iteration = 0
 
         while iteration < self.max_iterations:
             iteration += 1
 
-            if verbose:
-                print(f"\n{'='*40}")
-                print(f"Iteration {iteration}")
-                print(f"{'='*40}")
-                print(f"Step: Generating answer...")
+            logger.debug(
+                "\n%s\n"
+                "Iteration %s\n"
+                "%s\n"
+                "Step: Generating answer...",
+                '='*40,
+                iteration,
+                '='*40
+            )
+
+            # Generate answer (the routing call may already have answered)
+            if direct_answer:
+                answer, direct_answer = direct_answer, None
+            else:
+                stream = self.generate_answer_stream(query, context_docs)
+                answer_parts = [next(stream, "")]
+
+                # Prepare the evaluation input while the rest of the answer arrives
+                if context_summary is None:
+                    context_summary = self.build_context_summary(context_docs)
 
-            # Generate answer
-            answer = self.generate_answer(query, context_docs)
+                answer_parts.extend(stream)
+                answer = "".join(answer_parts)
 
-            if verbose:
-                print(f"\nGenerated answer preview:")
-                print(f"  {answer[:200]}...")
+            if context_summary is None:
+                context_summary = self.build_context_summary(context_docs)
+
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "\nGenerated answer preview:\n"
+                    "  %s...",
+                    answer[:200]
+                )
 
             # Evaluate answer
-            if verbose:
-                print(f"\nStep: Evaluating answer quality...")
+            logger.debug("\nStep: Evaluating answer quality...")
 
-            evaluation = self.evaluate_answer(query, answer, context_docs)
+            # Well-cited answers of normal length skip the LLM evaluation
+            evaluation = _cheap_eval(answer, context_docs) or self.evaluate_answer(
+                query, answer, context_docs, precomputed_summary=context_summary
+            )
             trace.append({
                 "iteration": iteration,
                 "step": "generation_and_evaluation",
                 "evaluation": evaluation
             })
 
-            if verbose:
-                print(f"  Overall quality: {evaluation['overall_quality']}")
-                print(f"  Grounded: {evaluation['grounded']['score']:.2f}")
-                print(f"  Useful: {evaluation['useful']['score']:.2f}")
-                print(f"  Complete: {evaluation['complete']['score']:.2f}")
-                print(f"  Recommendation: {evaluation['recommendation']}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "  Overall quality: %s\n"
+                    "  Grounded: %.2f\n"
+                    "  Useful: %.2f\n"
+                    "  Complete: %.2f\n"
+                    "  Recommendation: %s",
+                    evaluation['overall_quality'],
+                    evaluation['grounded']['score'],
+                    evaluation['useful']['score'],
+                    evaluation['complete']['score'],
+                    evaluation['recommendation']
+                )
 
             # Store best answer
             if best_evaluation is None or \
@@ -360,34 +757,45 @@ Respond in JSON format:
                 best_answer = answer
                 best_evaluation = evaluation
 
+            # Stop once another round is unlikely to help
+            score = self._quality_score(evaluation)
+            if iteration >= 2 and score - prev_score < self.min_improvement:
+                logger.debug("\n→ Quality plateaued, keeping best answer")
+                break
+            prev_score = score
+
+            if evaluation['overall_quality'] in ['excellent', 'good'] and \
+               evaluation['recommendation'] != 'retrieve_more':
+                logger.debug("\n✓ Answer is good enough")
+                break
+
             # Decide next action
             if evaluation['recommendation'] == 'accept':
-                if verbose:
-                    print(f"\n✓ Answer accepted!")
+                logger.debug("\n✓ Answer accepted!")
                 break
 
             elif evaluation['recommendation'] == 'regenerate':
-                if verbose:
-                    print(f"\n↻ Regenerating with stricter guidelines...")
+                logger.debug("\n↻ Regenerating with stricter guidelines...")
                 # Will regenerate in next iteration
                 continue
 
             elif evaluation['recommendation'] == 'retrieve_more':
-                if verbose:
-                    print(f"\n→ Retrieving additional context...")
+                logger.debug("\n→ Retrieving additional context...")
 
                 # Retrieve more documents with modified query
-                additional_docs = self.vector_store.search(
-                    query,
+                additional_docs = self.vector_store.search_by_vector(
+                    query_vector.tolist(),
                     top_k=5
                 )
-                # Add new docs that aren't already in context
-                existing_ids = {doc['id'] for doc in context_docs}
-                new_docs = [
-                    doc for doc in additional_docs
-                    if doc['id'] not in existing_ids
-                ]
-                context_docs.extend(new_docs[:2])
+                retrieval_history.append(additional_docs)
+
+                # Fuse every ranking so far, then let the reranker pick
+                # up to two more sources
+                fused = reciprocal_rank_fusion(retrieval_history)
+                context_docs = self.reranker.rerank(
+                    query, fused, top_k=min(len(fused), len(context_docs) + 2)
+                )
+                context_summary = None
                 continue
 
             else:
@@ -402,17 +810,26 @@ Respond in JSON format:
             final_answer = answer
             final_evaluation = evaluation
 
-        if verbose:
-            print(f"\n{'='*60}")
-            print("FINAL ANSWER:")
-            print(f"{'='*60}")
-            print(final_answer)
-            print(f"\nIterations: {iteration}")
-            print(f"Quality: {final_evaluation['overall_quality']}")
-            print(f"Sources used: {len(context_docs)}")
-            print(f"{'='*60}\n")
-
-        return {
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "\n%s\n"
+                "FINAL ANSWER:\n"
+                "%s\n"
+                "%s\n"
+                "\nIterations: %s\n"
+                "Quality: %s\n"
+                "Sources used: %s\n"
+                "%s\n",
+                '='*60,
+                '='*60,
+                final_answer,
+                iteration,
+                final_evaluation['overall_quality'],
+                len(context_docs),
+                '='*60
+            )
+
+        result = {
             'answer': final_answer,
             'evaluation': final_evaluation,
             'sources': context_docs,
@@ -421,6 +838,12 @@ Respond in JSON format:
             'retrieval_decision': retrieval_decision
         }
 
+        # Only cache answers the evaluation accepted
+        if final_evaluation.get('overall_quality') in ['excellent', 'good']:
+            self.answer_cache.add(query_vector, copy_result(result))
+
+        return result
+
 def main():
     """Test Self RAG"""
     from src.vector_store import VectorStore
@@ -7,11 +7,36 @@ Flow:
 3. Reranking → Top N documents
 4. LLM Generation → Answer
 """
-from typing import List, Dict, Any, Optional
-from openai import OpenAI
-from src.config import settings, get_openai_api_key
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Final, Optional, Tuple
+import httpx
+from openai import OpenAI, AsyncOpenAI
+from src.config import settings
+from src.agents.base_agent import get_openai_client
 from src.vector_store import VectorStore
 from src.reranker import DocumentReranker
+from src.tokenizer import count_tokens, truncate_to_tokens
+
+# Constant so every request starts with an identical, cacheable prefix
+SYSTEM_PROMPT: Final[str] = """You are a helpful customer support assistant for an e-commerce company.
+Your job is to answer customer questions accurately based on the provided context.
+
+Guidelines:
+- Use only the information from the provided context
+- Be concise but complete
+- Cite sources using [Source N] notation
+- If the context doesn't contain enough information to answer fully, say so
+- Maintain a professional, friendly tone
+- Provide specific details (prices, timeframes, etc.) when available"""
+
+# Cross-encoder inference releases the GIL, so reranking on this thread
+# overlaps with LLM calls on the event loop. One worker keeps reranks from
+# competing for the cores torch's own thread pool already uses.
+RERANK_EXECUTOR = ThreadPoolExecutor(max_workers=1)
+
+# Source markers for context rendering, built once
+SOURCE_TAGS = [f"[Source {i}]" for i in range(1, 65)]
 
 class TraditionalRAG:
     """Traditional RAG pipeline with retrieval, reranking, and generation"""
@@ -22,7 +47,11 @@ class TraditionalRAG:
         reranker: DocumentReranker = None,
         model: str = None,
         top_k: int = None,
-        rerank_k: int = None
+        rerank_k: int = None,
+        max_context_tokens: int = 6000,
+        mmr_lambda: Optional[float] = None,
+        client: OpenAI = None,
+        aclient: AsyncOpenAI = None
     ):
         """
         Initialize Traditional RAG
@@ -33,14 +62,30 @@ class TraditionalRAG:
             model: OpenAI model name
             top_k: Number of documents to retrieve
             rerank_k: Number of documents after reranking
+            max_context_tokens: Prompt token budget; longer sources are
+                truncated to fit
+            mmr_lambda: Diversify reranked sources with MMR at this
+                relevance weight (plain reranking if None)
+            client: OpenAI client (defaults to the process-wide pooled client)
+            aclient: Async OpenAI client for aquery_batch (defaults to one
+                built from client's key and base URL, per event loop)
         """
         self.vector_store = vector_store
         self.reranker = reranker or DocumentReranker()
         self.model = model or settings.openai_chat_model
         self.top_k = top_k or settings.default_top_k
         self.rerank_k = rerank_k or settings.rerank_top_k
+        self.max_context_tokens = max_context_tokens
+        self.mmr_lambda = mmr_lambda
 
-        self.client = OpenAI(api_key=get_openai_api_key())
+        # The system prompt never changes, so count its tokens once
+        self.system_tokens = count_tokens(SYSTEM_PROMPT, self.model)
+
+        self.client = client or get_openai_client()
+        self.aclient = aclient
+
+        # (event loop, client) built for aquery_batch when none was injected
+        self._loop_aclient: Optional[Tuple[asyncio.AbstractEventLoop, AsyncOpenAI]] = None
 
     def retrieve(self, query: str) -> List[Dict[str, Any]]:
         """
@@ -55,6 +100,18 @@ class TraditionalRAG:
         results = self.vector_store.search(query, top_k=self.top_k)
         return results
 
+    def retrieve_batch(self, queries: List[str]) -> List[List[Dict[str, Any]]]:
+        """
+        Retrieve documents for several queries with one embedding call
+
+        Args:
+            queries: User queries
+
+        Returns:
+            Retrieved documents per query, in query order
+        """
+        return self.vector_store.search_batch(queries, top_k=self.top_k)
+
     def rerank(self, query: str, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
         Rerank documents for better relevance
@@ -66,6 +123,15 @@ class TraditionalRAG:
         Returns:
             Reranked documents
         """
+        if self.mmr_lambda is not None and documents:
+            return self.reranker.rerank_mmr(
+                query,
+                documents,
+                self.vector_store.get_embeddings([doc['id'] for doc in documents]),
+                top_k=self.rerank_k,
+                lambda_=self.mmr_lambda
+            )
+
         reranked = self.reranker.rerank(query, documents, top_k=self.rerank_k)
         return reranked
 
@@ -80,52 +146,106 @@ class TraditionalRAG:
         Returns:
             Generated answer with metadata
         """
-        # Build context from documents
-        context_parts = []
-        for i, doc in enumerate(context_docs, 1):
-            context_parts.append(f"[Source {i}]")
-            context_parts.append(doc['content'])
-            context_parts.append("")
+        context_docs, messages = self.build_messages(query, context_docs)
 
-        context = "\n".join(context_parts)
+        # Call LLM
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=settings.temperature,
+            max_tokens=settings.max_tokens
+        )
 
-        # Create prompt
-        system_prompt = """You are a helpful customer support assistant for an e-commerce company.
-Your job is to answer customer questions accurately based on the provided context.
+        return self._build_result(response, context_docs)
 
-Guidelines:
-- Use only the information from the provided context
-- Be concise but complete
-- Cite sources using [Source N] notation
-- If the context doesn't contain enough information to answer fully, say so
-- Maintain a professional, friendly tone
-- Provide specific details (prices, timeframes, etc.) when available"""
-
-        user_prompt = f"""Context:
-{context}
+    async def agenerate(
+        self,
+        aclient: AsyncOpenAI,
+        query: str,
+        context_docs: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        Async variant of generate
 
-Customer Question: {query}
+        Args:
+            aclient: Async OpenAI client bound to the running event loop
+            query: User query
+            context_docs: Context documents
 
-Please provide a helpful answer based on the context above."""
+        Returns:
+            Generated answer with metadata
+        """
+        context_docs, messages = self.build_messages(query, context_docs)
 
-        # Call LLM
-        response = self.client.chat.completions.create(
+        response = await aclient.chat.completions.create(
             model=self.model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
+            messages=messages,
             temperature=settings.temperature,
             max_tokens=settings.max_tokens
         )
 
+        return self._build_result(response, context_docs)
+
+    def build_messages(
+        self,
+        query: str,
+        context_docs: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, str]]]:
+        """
+        Build the chat messages answering a query from context documents
+
+        Args:
+            query: User query
+            context_docs: Context documents, most relevant first
+
+        Returns:
+            Context documents in source order, and the chat messages
+        """
+        # Split what is left of the context window evenly across documents
+        max_doc_tokens = 0
+        if context_docs:
+            budget = self.max_context_tokens - self.system_tokens - count_tokens(query, self.model)
+            max_doc_tokens = max(budget // len(context_docs), 0)
+
+        # Build context from documents
+        tags = SOURCE_TAGS
+        if len(context_docs) > len(tags):
+            tags = [f"[Source {i}]" for i in range(1, len(context_docs) + 1)]
+
+        context = "\n".join(
+            f"{tag}\n{truncate_to_tokens(doc['content'], max_doc_tokens, self.model)}\n"
+            for tag, doc in zip(tags, context_docs)
+        )
+
+        # Static system prompt, then context, then the question: the
+        # longest stable prefix comes first for prompt caching
+        context_prompt = f"""Context:
+{context}"""
+
+        question_prompt = f"""Customer Question: {query}
+
+Please provide a helpful answer based on the context above."""
+
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": context_prompt},
+            {"role": "user", "content": question_prompt}
+        ]
+
+        return context_docs, messages
+
+    def _build_result(self, response: Any, context_docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Package a chat completion as a pipeline result"""
         answer = response.choices[0].message.content
 
+        details = getattr(response.usage, 'prompt_tokens_details', None)
+
         return {
             'answer': answer,
             'sources': context_docs,
             'model': self.model,
-            'num_sources': len(context_docs)
+            'num_sources': len(context_docs),
+            'cached_tokens': getattr(details, 'cached_tokens', None) or 0
         }
 
     def query(self, query: str, verbose: bool = False) -> Dict[str, Any]:
@@ -151,6 +271,129 @@ Please provide a helpful answer based on the context above."""
 
         retrieved_docs = self.retrieve(query)
 
+        return self._answer(query, retrieved_docs, verbose)
+
+    def query_batch(self, queries: List[str], verbose: bool = False) -> List[Dict[str, Any]]:
+        """
+        Execute the RAG pipeline for several queries
+
+        Retrieval for all queries is batched into one embedding call and
+        one vector search; reranking and generation then run per query.
+
+        Args:
+            queries: User queries
+            verbose: Print intermediate steps
+
+        Returns:
+            Complete responses, in query order
+        """
+        if verbose:
+            print(f"\nRetrieving top {self.top_k} documents for {len(queries)} queries...")
+
+        retrieved = self.retrieve_batch(queries)
+
+        results = []
+        for query, retrieved_docs in zip(queries, retrieved):
+            if verbose:
+                print(f"\n{'='*60}")
+                print(f"Query: {query}\n")
+            results.append(self._answer(query, retrieved_docs, verbose))
+
+        return results
+
+    async def aquery(self, query: str) -> Dict[str, Any]:
+        """
+        Execute the RAG pipeline for one query asynchronously
+
+        Args:
+            query: User query
+
+        Returns:
+            Complete response with answer and metadata
+        """
+        return (await self.aquery_batch([query]))[0]
+
+    async def aquery_batch(
+        self,
+        queries: List[str],
+        concurrency: int = 8
+    ) -> List[Dict[str, Any]]:
+        """
+        Execute the RAG pipeline for several queries, generating concurrently
+
+        Retrieval is batched into one embedding call and one search, and
+        the LLM calls for all queries overlap, so a batch takes about as
+        long as its slowest generation rather than the sum of them.
+        Reranking runs on a worker thread, so each query's generation
+        starts as soon as its own documents are reranked.
+
+        Args:
+            queries: User queries
+            concurrency: Maximum LLM calls in flight
+
+        Returns:
+            Complete responses, in query order
+        """
+        retrieved = self.retrieve_batch(queries)
+
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(concurrency)
+        aclient = self.aclient or self._async_client(loop)
+
+        async def answer_one(query: str, docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+            reranked = await loop.run_in_executor(RERANK_EXECUTOR, self.rerank, query, docs)
+
+            async with semaphore:
+                return await self.agenerate(aclient, query, reranked)
+
+        return await asyncio.gather(*[
+            answer_one(query, docs) for query, docs in zip(queries, retrieved)
+        ])
+
+    def _async_client(self, loop: asyncio.AbstractEventLoop) -> AsyncOpenAI:
+        """
+        Async counterpart of self.client, built once per event loop
+
+        Its HTTP/2 pool's connections are bound to the loop that opened
+        them, so a batch run under a new loop gets a new client.
+
+        Args:
+            loop: Running event loop
+
+        Returns:
+            Async OpenAI client using self.client's key and base URL
+        """
+        if self._loop_aclient is None or self._loop_aclient[0] is not loop:
+            aclient = AsyncOpenAI(
+                api_key=self.client.api_key,
+                base_url=self.client.base_url,
+                http_client=httpx.AsyncClient(
+                    http2=True,
+                    limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+                    timeout=30.0
+                )
+            )
+            self._loop_aclient = (loop, aclient)
+
+        return self._loop_aclient[1]
+
+    def _answer(
+        self,
+        query: str,
+        retrieved_docs: List[Dict[str, Any]],
+        verbose: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Rerank retrieved documents and generate the answer
+
+        Args:
+            query: User query
+            retrieved_docs: Documents retrieved for the query
+            verbose: Print intermediate steps
+
+        Returns:
+            Complete response with answer and metadata
+        """
         if verbose:
             print(f"Retrieved {len(retrieved_docs)} documents")
             for i, doc in enumerate(retrieved_docs[:3], 1):
@@ -178,7 +421,7 @@ Please provide a helpful answer based on the context above."""
             print("ANSWER:")
             print(f"{'='*60}")
             print(result['answer'])
-            print(f"\n(Used {result['num_sources']} sources)")
+            print(f"\n(Used {result['num_sources']} sources, {result['cached_tokens']} cached prompt tokens)")
             print(f"{'='*60}\n")
 
         return result
@@ -204,9 +447,14 @@ def main():
         "Do you ship internationally?"
     ]
 
-    for query in test_queries:
-        result = rag.query(query, verbose=True)
-        input("\nPress Enter to continue to next query...")
+    # Retrieve in one batch and generate all answers concurrently
+    results = asyncio.run(rag.aquery_batch(test_queries))
+
+    for query, result in zip(test_queries, results):
+        print(f"\n{'='*60}")
+        print(f"Query: {query}\n")
+        print(result['answer'])
+        print(f"\n(Used {result['num_sources']} sources)")
 
 if __name__ == "__main__":
     main()
@@ -1,29 +1,170 @@
 """
 Document reranking using cross-encoder models
 """
-from typing import List, Dict, Any
+import functools
+import hashlib
+from collections import defaultdict
+from typing import List, Dict, Any, Optional
+import numpy as np
+import torch
 from sentence_transformers import CrossEncoder
+from transformers import AutoTokenizer
 from src.config import settings
 
+# Largest number of pairs scored in one forward pass (bounds activation memory)
+MAX_PREDICT_BATCH = 128
+
+# Exports shipped in the model repo, per sentence-transformers backend: the
+# int8 ones target VNNI, so other CPUs get the plain fp32 ONNX graph
+_BACKEND_FILES = {
+    "openvino": "openvino/openvino_model_qint8_quantized.xml",
+    "onnx": "onnx/model.onnx"
+}
+_ONNX_VNNI_FILE = "onnx/model_qint8_avx512_vnni.onnx"
+
+@functools.lru_cache(maxsize=1)
+def cpu_supports_vnni() -> bool:
+    """Whether the CPU has AVX-512 VNNI int8 dot-product instructions"""
+    try:
+        with open("/proc/cpuinfo") as f:
+            return "avx512_vnni" in f.read()
+    except OSError:
+        return False
+
+def default_model_file(backend: str) -> str:
+    """Export to load for a backend on this CPU"""
+    if backend == "onnx" and cpu_supports_vnni():
+        return _ONNX_VNNI_FILE
+    return _BACKEND_FILES[backend]
+
 class DocumentReranker:
     """Rerank documents using cross-encoder for better relevance"""
 
-    def __init__(self, model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"):
+    def __init__(
+        self,
+        model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+        backend: str = "auto",
+        model_file: str = None,
+        dtype: Optional[torch.dtype] = None,
+        max_length: int = 256,
+        single_interop_thread: bool = False
+    ):
         """
         Initialize reranker with cross-encoder model
 
         Args:
             model_name: HuggingFace cross-encoder model name
+            backend: "openvino", "onnx", "torch", or "auto" (torch on CUDA,
+                OpenVINO on VNNI-capable CPUs, ONNX otherwise). Unavailable
+                backends fall back through ONNX to torch.
+            model_file: Export within the model repo to load (defaults to
+                the int8 export on VNNI CPUs, plain ONNX otherwise)
+            dtype: Torch backend weight dtype (defaults to float16 on CUDA
+                and float32 on CPU)
+            max_length: Token limit per (query, document) pair; knowledge
+                base documents fit well within the default
+            single_interop_thread: Limit torch to one inter-op thread for the
+                whole process, so reranking alongside LLM and retrieval
+                threads does not oversubscribe the cores
+        """
+        if single_interop_thread:
+            try:
+                torch.set_num_interop_threads(1)
+            except RuntimeError:
+                # Already set, or torch has started parallel work
+                print("Could not limit torch inter-op threads; keeping the current setting")
+
+        cuda = torch.cuda.is_available()
+
+        if backend == "auto":
+            if cuda:
+                backend = "torch"
+            else:
+                backend = "openvino" if cpu_supports_vnni() else "onnx"
+
+        print(f"Loading reranker model: {model_name} ({backend})")
+
+        candidates = [backend] + [b for b in ("onnx", "torch") if b != backend]
+        candidates = candidates[:candidates.index("torch") + 1]
+
+        for candidate in candidates:
+            if candidate == "torch":
+                if dtype is None and cuda:
+                    dtype = torch.float16
+                self.model = CrossEncoder(
+                    model_name,
+                    max_length=max_length,
+                    device="cuda" if cuda else None,
+                    model_kwargs={"torch_dtype": dtype} if dtype else None
+                )
+                break
+
+            try:
+                self.model = CrossEncoder(
+                    model_name,
+                    max_length=max_length,
+                    backend=candidate,
+                    model_kwargs={
+                        "file_name": (candidate == backend and model_file) or default_model_file(candidate)
+                    }
+                )
+                break
+            except Exception as e:
+                print(f"{candidate} reranker unavailable ({e}), falling back")
+
+        self.backend = candidate
+
+        # Tokenization runs on every rerank; make sure it is the Rust tokenizer
+        if not self.model.tokenizer.is_fast:
+            self.model.tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True)
+
+        print(f"Reranker model loaded successfully ({self.backend})")
+
+    def predict(self, pairs: List[tuple], **kwargs) -> Any:
+        """
+        Score (query, document) pairs in as few forward passes as possible
+
+        Args:
+            pairs: (query, document content) pairs
+            **kwargs: Extra CrossEncoder.predict arguments
+
+        Returns:
+            Scores as a numpy array, in pair order
+        """
+        with torch.inference_mode():
+            return self.model.predict(
+                pairs,
+                batch_size=min(len(pairs), MAX_PREDICT_BATCH),
+                convert_to_numpy=True,
+                show_progress_bar=False,
+                **kwargs
+            )
+
+    def score(self, query: str, documents: List[Dict[str, Any]]) -> List[float]:
+        """
+        Score documents against a query as probabilities in [0, 1]
+
+        Args:
+            query: Search query
+            documents: Documents to score
+
+        Returns:
+            Relevance probability per document, in input order
         """
-        print(f"Loading reranker model: {model_name}")
-        self.model = CrossEncoder(model_name)
-        print("Reranker model loaded successfully")
+        if not documents:
+            return []
+
+        pairs = [(query, doc['content']) for doc in documents]
+        scores = self.predict(pairs, activation_fn=torch.nn.Sigmoid())
+
+        return [float(score) for score in scores]
 
     def rerank(
         self,
         query: str,
         documents: List[Dict[str, Any]],
-        top_k: int = None
+        top_k: int = None,
+        reuse_scores: bool = False
     ) -> List[Dict[str, Any]]:
         """
         Rerank documents based on relevance to query
@@ -32,30 +173,254 @@ class DocumentReranker:
             query: Search query
             documents: List of documents from vector search
             top_k: Number of top documents to return
+            reuse_scores: Keep an existing rerank_score instead of rescoring
+                (only when it was computed for this same query)
 
         Returns:
-            Reranked documents with updated scores
+            Top documents, best first, as copies with rerank_score set
         """
         top_k = top_k or settings.rerank_top_k
 
         if not documents:
             return []
 
-        # Prepare pairs for cross-encoder
-        pairs = [(query, doc['content']) for doc in documents]
+        scores = self.score_array(query, documents, reuse_scores=reuse_scores)
+
+        # Select the top k without sorting the rest, then order just those
+        k = min(top_k, len(documents))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+
+        # Copies, leaving the caller's documents as is
+        return [
+            dict(documents[i], rerank_score=float(scores[i]))
+            for i in top
+        ]
+
+    def annotate(
+        self,
+        query: str,
+        documents: List[Dict[str, Any]],
+        reuse_scores: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Score documents with the cross-encoder, keeping their order
+
+        Args:
+            query: Search query
+            documents: Documents to score
+            reuse_scores: Keep an existing rerank_score instead of rescoring
+                (only when it was computed for this same query)
+
+        Returns:
+            Copies of documents with rerank_score set, in input order
+        """
+        scores = self.score_array(query, documents, reuse_scores=reuse_scores)
+
+        # Copies, leaving the caller's documents as is
+        return [
+            dict(doc, rerank_score=float(score))
+            for doc, score in zip(documents, scores)
+        ]
+
+    def score_array(
+        self,
+        query: str,
+        documents: List[Dict[str, Any]],
+        reuse_scores: bool = False
+    ) -> np.ndarray:
+        """
+        Raw cross-encoder scores for documents
+
+        Args:
+            query: Search query
+            documents: Documents to score
+            reuse_scores: Keep an existing rerank_score instead of rescoring
+                (only when it was computed for this same query)
+
+        Returns:
+            float32 scores, in input order
+        """
+        scores = np.empty(len(documents), dtype=np.float32)
+        pending = []
+
+        for i, doc in enumerate(documents):
+            if reuse_scores and 'rerank_score' in doc:
+                scores[i] = doc['rerank_score']
+            else:
+                pending.append(i)
+
+        if pending:
+            # Prepare pairs for cross-encoder
+            pairs = [(query, documents[i]['content']) for i in pending]
+
+            # Get relevance scores
+            scores[pending] = self.predict(pairs)
+
+        return scores
+
+    def rerank_mmr(
+        self,
+        query: str,
+        documents: List[Dict[str, Any]],
+        embeddings: np.ndarray,
+        top_k: int = None,
+        lambda_: float = 0.7,
+        reuse_scores: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Rerank documents with Maximal Marginal Relevance
+
+        Cross-encoder relevance is traded off against similarity to the
+        documents already selected, so near-duplicates don't crowd out
+        other relevant sources.
+
+        Args:
+            query: Search query
+            documents: List of documents from vector search
+            embeddings: Document embeddings, one row per document
+            top_k: Number of documents to return
+            lambda_: Weight of relevance versus diversity (1.0 is plain reranking)
+            reuse_scores: Keep an existing rerank_score instead of rescoring
+                (only when it was computed for this same query)
+
+        Returns:
+            Selected documents in MMR order, as copies with rerank_score set
+        """
+        top_k = top_k or settings.rerank_top_k
+
+        if not documents:
+            return []
+
+        scores = self.score_array(query, documents, reuse_scores=reuse_scores)
+
+        # Put relevance on the same [0, 1] scale as cosine similarity
+        spread = scores.max() - scores.min()
+        relevance = (scores - scores.min()) / spread if spread > 0 else np.ones_like(scores)
+
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+        selected = mmr_select(relevance, vectors @ vectors.T, top_k, lambda_)
+
+        return [
+            dict(documents[i], rerank_score=float(scores[i]))
+            for i in selected
+        ]
+
+def mmr_select(
+    relevance: np.ndarray,
+    similarity: np.ndarray,
+    k: int,
+    lambda_: float = 0.7
+) -> List[int]:
+    """
+    Greedy Maximal Marginal Relevance selection
+
+    Each step is one vectorized pass over the candidates, keeping a
+    running maximum similarity to the selected set (O(k * n) overall).
+
+    Args:
+        relevance: Relevance per candidate
+        similarity: Pairwise candidate similarity matrix
+        k: Number of candidates to select
+        lambda_: Weight of relevance versus diversity
+
+    Returns:
+        Indices of the selected candidates, in selection order
+    """
+    n = len(relevance)
+    max_similarity = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    selected: List[int] = []
+
+    for _ in range(min(k, n)):
+        mmr = lambda_ * relevance - (1 - lambda_) * max_similarity
+        mmr[~available] = -np.inf
+
+        best = int(np.argmax(mmr))
+        selected.append(best)
+        available[best] = False
+        max_similarity = np.maximum(max_similarity, similarity[best])
+
+    return selected
+
+def reciprocal_rank_fusion(
+    ranked_lists: List[List[Dict[str, Any]]],
+    k: int = 60
+) -> List[Dict[str, Any]]:
+    """
+    Merge ranked document lists with Reciprocal Rank Fusion
+
+    Args:
+        ranked_lists: Document lists, each ordered best first
+        k: Rank smoothing constant
+
+    Returns:
+        Unique documents (first occurrence kept), ordered by fused score
+    """
+    scores: Dict[str, float] = defaultdict(float)
+    docs: Dict[str, Dict[str, Any]] = {}
+
+    for ranked in ranked_lists:
+        for rank, doc in enumerate(ranked):
+            scores[doc['id']] += 1 / (k + rank + 1)
+            docs.setdefault(doc['id'], doc)
+
+    return sorted(docs.values(), key=lambda doc: scores[doc['id']], reverse=True)
+
+def simhash64(text: str, shingle_size: int = 4) -> int:
+    """
+    64-bit SimHash of a text over word shingles
+
+    Near-duplicate texts get hashes a small Hamming distance apart.
+
+    Args:
+        text: Text to hash
+        shingle_size: Words per shingle
+
+    Returns:
+        SimHash as an unsigned 64-bit int
+    """
+    words = text.lower().split()
+    shingles = [
+        " ".join(words[i:i + shingle_size])
+        for i in range(max(len(words) - shingle_size + 1, 1))
+    ]
+
+    weights = [0] * 64
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), 'big')
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+def drop_near_duplicates(
+    documents: List[Dict[str, Any]],
+    max_distance: int = 3
+) -> List[Dict[str, Any]]:
+    """
+    Drop documents whose SimHash is within max_distance bits of an earlier one
 
-        # Get relevance scores
-        scores = self.model.predict(pairs)
+    Args:
+        documents: Documents, best first
+        max_distance: Largest Hamming distance treated as a duplicate
 
-        # Add rerank scores to documents
-        for doc, score in zip(documents, scores):
-            doc['rerank_score'] = float(score)
+    Returns:
+        Documents with near-duplicates removed, order preserved
+    """
+    seen: List[int] = []
+    unique = []
 
-        # Sort by rerank score
-        reranked = sorted(documents, key=lambda x: x['rerank_score'], reverse=True)
+    for doc in documents:
+        h = simhash64(doc['content'])
+        if any((h ^ s).bit_count() <= max_distance for s in seen):
+            continue
+        seen.append(h)
+        unique.append(doc)
 
-        # Return top k
-        return reranked[:top_k]
+    return unique
 
 def main():
     """Test reranker"""
@@ -0,0 +1,177 @@
+"""
+Query caches keyed by normalized text or by embedding similarity
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+import numpy as np
+from src.embeddings import EmbeddingGenerator
+
+def normalize_query(query: str) -> str:
+    """Hash a query with case and whitespace differences removed"""
+    return hashlib.sha256(" ".join(query.lower().split()).encode()).hexdigest()
+
+def copy_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy a pipeline result's sources and trace so cache hits stay independent"""
+    return {
+        **result,
+        'sources': [dict(doc) for doc in result['sources']],
+        'trace': result['trace'].copy()
+    }
+
+class QueryCache:
+    """In-process LRU cache for values computed from a query's exact text"""
+
+    def __init__(self, max_size: int = 1024):
+        """
+        Initialize query cache
+
+        Args:
+            max_size: Maximum entries before least-recently-used eviction
+        """
+        self.max_size = max_size
+        self.entries: "OrderedDict[str, Any]" = OrderedDict()
+        # Shared by pipeline and agent threads; move_to_end and eviction
+        # must not interleave
+        self._lock = threading.Lock()
+
+    def get(self, query: str) -> Optional[Any]:
+        """
+        Look up the value stored for a query
+
+        Args:
+            query: Query text (normalized before lookup)
+
+        Returns:
+            Cached value, or None on a miss
+        """
+        key = normalize_query(query)
+        with self._lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+        return value
+
+    def add(self, query: str, value: Any):
+        """
+        Store a value for a query, evicting the least recently used entry
+        when full
+
+        Args:
+            query: Query text (normalized before storing)
+            value: Value to cache
+        """
+        key = normalize_query(query)
+        with self._lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self.entries.clear()
+
+class SemanticCache:
+    """In-process cache that returns values stored for similar texts"""
+
+    def __init__(
+        self,
+        embedder: EmbeddingGenerator = None,
+        threshold: float = 0.92,
+        max_size: int = 1024,
+        ttl: Optional[float] = None
+    ):
+        """
+        Initialize semantic cache
+
+        Args:
+            embedder: Embedding generator used to embed lookup texts
+            threshold: Minimum cosine similarity for a hit
+            max_size: Maximum entries before least-recently-used eviction
+            ttl: Seconds an entry stays valid (None for no expiry)
+        """
+        self.embedder = embedder or EmbeddingGenerator()
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl = ttl
+
+        # Preallocated once the embedding dimension is known
+        self.embeddings: Optional[np.ndarray] = None
+        self.values: List[Any] = []
+        self.created_at: Optional[np.ndarray] = None
+        self._sims: Optional[np.ndarray] = None  # Reused similarity buffer
+        self.last_used: Optional[np.ndarray] = None
+        self._clock = 0
+        # Guards the slot arrays and the shared similarity buffer
+        self._lock = threading.Lock()
+
+    def embed(self, text: str) -> np.ndarray:
+        """Embed text as a unit-length float32 vector"""
+        vector = np.asarray(self.embedder.generate_embedding(text), dtype=np.float32)
+        vector /= np.linalg.norm(vector)
+        return vector
+
+    def get(self, vector: np.ndarray) -> Optional[Any]:
+        """
+        Look up the value stored for the most similar vector
+
+        Args:
+            vector: Unit-length query vector (see embed)
+
+        Returns:
+            Cached value, or None if nothing is similar enough
+        """
+        with self._lock:
+            if not self.values:
+                return None
+
+            n = len(self.values)
+            sims = np.dot(self.embeddings[:n], vector, out=self._sims[:n])
+            candidates = np.flatnonzero(sims >= self.threshold)
+
+            if self.ttl is not None:
+                age = time.time() - self.created_at[candidates]
+                candidates = candidates[age <= self.ttl]
+
+            if not len(candidates):
+                return None
+
+            slot = candidates[np.argmax(sims[candidates])]
+            self._touch(slot)
+            return self.values[slot]
+
+    def add(self, vector: np.ndarray, value: Any):
+        """
+        Store a value under a vector, evicting the least recently used entry
+        when full
+
+        Args:
+            vector: Unit-length vector (see embed)
+            value: Value to cache
+        """
+        with self._lock:
+            if self.embeddings is None:
+                self.embeddings = np.zeros((self.max_size, vector.shape[0]), dtype=np.float32)
+                self.created_at = np.zeros(self.max_size, dtype=np.float64)
+                self._sims = np.empty(self.max_size, dtype=np.float32)
+                self.last_used = np.zeros(self.max_size, dtype=np.int64)
+
+            if len(self.values) < self.max_size:
+                slot = len(self.values)
+                self.values.append(value)
+            else:
+                slot = int(np.argmin(self.last_used))
+                self.values[slot] = value
+
+            self.embeddings[slot] = vector
+            self.created_at[slot] = time.time()
+            self._touch(slot)
+
+    def _touch(self, slot: int):
+        """Mark an entry as most recently used (caller holds the lock)"""
+        self._clock += 1
+        self.last_used[slot] = self._clock
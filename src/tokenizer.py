@@ -0,0 +1,43 @@
+"""
+Token counting and truncation using tiktoken
+"""
+import functools
+import tiktoken
+from src.config import settings
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model: str = None) -> tiktoken.Encoding:
+    """Get (and cache) the tiktoken encoding for a model"""
+    model = model or settings.openai_fast_model
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+def count_tokens(text: str, model: str = None) -> int:
+    """Count tokens in text"""
+    return len(get_encoding(model).encode(text))
+
+@functools.lru_cache(maxsize=4096)
+def truncate_to_tokens(text: str, max_tokens: int, model: str = None) -> str:
+    """
+    Truncate text to at most max_tokens tokens
+
+    Results are memoized, so the same document snippet is only encoded
+    once however many times it is retrieved and graded.
+
+    Args:
+        text: Text to truncate
+        max_tokens: Token budget
+        model: Model whose tokenizer to use
+
+    Returns:
+        Text cut at a token boundary (unchanged if within budget)
+    """
+    encoding = get_encoding(model)
+    tokens = encoding.encode(text)
+
+    if len(tokens) <= max_tokens:
+        return text
+
+    return encoding.decode(tokens[:max(max_tokens, 0)])
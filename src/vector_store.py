@@ -1,12 +1,20 @@
 """
 Vector store operations using ChromaDB
 """
+import hashlib
+import os
 from typing import List, Dict, Any, Optional
+import numpy as np
 import chromadb
 from chromadb.config import Settings as ChromaSettings
 from src.config import settings
 from src.data_loader import Document
 from src.embeddings import EmbeddingGenerator
+from src.semantic_cache import QueryCache
+
+# Collection metadata ChromaDB only applies when a collection is created;
+# hnsw:num_threads is left out since it only depends on the machine
+_INDEX_KEYS = ("hnsw:space", "hnsw:M", "hnsw:construction_ef", "hnsw:search_ef")
 
 class VectorStore:
     """Vector store for document retrieval"""
@@ -15,8 +23,30 @@ class VectorStore:
         self,
         collection_name: str = None,
         persist_directory: str = None,
-        embedding_generator: EmbeddingGenerator = None
+        embedding_generator: EmbeddingGenerator = None,
+        hnsw_m: int = 32,
+        hnsw_construction_ef: int = 200,
+        hnsw_search_ef: int = 64,
+        hnsw_num_threads: int = None
     ):
+        """
+        Initialize vector store
+
+        Unfiltered searches are scored exactly over an in-memory copy of
+        the collection; only searches with a metadata filter use the HNSW
+        index. An existing collection whose distance or graph settings
+        differ from these is recreated empty, to be repopulated.
+
+        Args:
+            collection_name: ChromaDB collection name
+            persist_directory: Directory ChromaDB persists to
+            embedding_generator: Embedding generator for documents and queries
+            hnsw_m: Graph neighbours per node
+            hnsw_construction_ef: Candidate list size while building the graph
+            hnsw_search_ef: Candidate list size per query; keep it >= the
+                largest top_k searched, or recall drops
+            hnsw_num_threads: Index build threads (defaults to all CPUs)
+        """
         self.collection_name = collection_name or settings.collection_name
         self.persist_directory = persist_directory or str(settings.vector_store_dir)
         self.embedding_generator = embedding_generator or EmbeddingGenerator()
@@ -30,29 +60,70 @@ class VectorStore:
             )
         )
 
+        self.collection_metadata = {
+            "description": "Customer support knowledge base",
+            "hnsw:space": "cosine",
+            "hnsw:M": hnsw_m,
+            "hnsw:construction_ef": hnsw_construction_ef,
+            "hnsw:search_ef": hnsw_search_ef,
+            "hnsw:num_threads": hnsw_num_threads or os.cpu_count() or 1
+        }
+
         # Get or create collection
-        self.collection = self.client.get_or_create_collection(
+        self.collection = self._open_collection()
+
+        # In-memory copy of the collection for exact unfiltered search,
+        # loaded on first search and dropped whenever the collection changes
+        self._matrix: Optional[Dict[str, Any]] = None
+
+        # Query embeddings only depend on the query and the embedding model;
+        # unfiltered results also depend on the corpus and are cleared with it
+        self.embedding_cache = QueryCache(max_size=1024)
+        self.result_cache = QueryCache(max_size=1024)
+
+    def _open_collection(self):
+        """Open the collection, (re)creating it if its index settings differ"""
+        if any(c.name == self.collection_name for c in self.client.list_collections()):
+            collection = self.client.get_collection(name=self.collection_name)
+
+            # ChromaDB fixes the index settings at creation and rejects
+            # changing them, so a mismatched index has to be rebuilt
+            stored = collection.metadata or {}
+            if all(stored.get(key) == self.collection_metadata[key] for key in _INDEX_KEYS):
+                return collection
+
+            print(f"Index settings of {self.collection_name} changed, recreating it...")
+            self.client.delete_collection(self.collection_name)
+
+        return self.client.create_collection(
             name=self.collection_name,
-            metadata={"description": "Customer support knowledge base"}
+            metadata=self.collection_metadata
         )
 
-    def add_documents(self, documents: List[Document], batch_size: int = 100):
+    def add_documents(self, documents: List[Document], batch_size: int = 512):
         """Add documents to vector store in batches"""
         print(f"Adding {len(documents)} documents to vector store...")
 
-        for i in range(0, len(documents), batch_size):
+        # Batches are embedded concurrently; each is stored as soon as it
+        # and the batches before it are ready
+        embedding_batches = self.embedding_generator.iter_embedding_batches(
+            [doc.content for doc in documents],
+            batch_size=batch_size
+        )
+
+        for i, embeddings in zip(range(0, len(documents), batch_size), embedding_batches):
             batch = documents[i:i + batch_size]
 
             # Extract components
             contents = [doc.content for doc in batch]
             ids = [doc.doc_id for doc in batch]
-            metadatas = [doc.metadata for doc in batch]
-
-            # Generate embeddings
-            print(f"Processing batch {i//batch_size + 1}/{(len(documents)-1)//batch_size + 1}...")
-            embeddings = self.embedding_generator.generate_embeddings(contents)
+            metadatas = [
+                {**doc.metadata, 'content_sha1': content_sha1(doc.content)}
+                for doc in batch
+            ]
 
             # Add to collection
+            print(f"Processing batch {i//batch_size + 1}/{(len(documents)-1)//batch_size + 1}...")
             self.collection.add(
                 embeddings=embeddings,
                 documents=contents,
@@ -60,8 +131,57 @@ class VectorStore:
                 ids=ids
             )
 
+        self._matrix = None
+        self.result_cache.clear()
         print(f"Successfully added {len(documents)} documents")
 
+    def sync_documents(self, documents: List[Document]) -> Dict[str, int]:
+        """
+        Make the collection match documents, embedding only what changed
+
+        Documents are compared by the content hash stored in their
+        metadata; changed documents are deleted and re-added, and
+        documents no longer present are removed.
+
+        Args:
+            documents: Full set of documents the collection should hold
+
+        Returns:
+            Counts of added, updated, removed and unchanged documents
+        """
+        existing = self.collection.get(include=["metadatas"])
+        stored_hashes = {
+            doc_id: (metadata or {}).get('content_sha1')
+            for doc_id, metadata in zip(existing['ids'], existing['metadatas'])
+        }
+
+        to_add = []
+        to_update = []
+        for doc in documents:
+            if doc.doc_id not in stored_hashes:
+                to_add.append(doc)
+            elif stored_hashes[doc.doc_id] != content_sha1(doc.content):
+                to_update.append(doc)
+
+        current_ids = {doc.doc_id for doc in documents}
+        to_remove = [doc_id for doc_id in stored_hashes if doc_id not in current_ids]
+
+        stale = [doc.doc_id for doc in to_update] + to_remove
+        if stale:
+            self.collection.delete(ids=stale)
+            self._matrix = None
+            self.result_cache.clear()
+
+        if to_add or to_update:
+            self.add_documents(to_add + to_update)
+
+        return {
+            'added': len(to_add),
+            'updated': len(to_update),
+            'removed': len(to_remove),
+            'unchanged': len(documents) - len(to_add) - len(to_update)
+        }
+
     def search(
         self,
         query: str,
@@ -71,37 +191,185 @@ class VectorStore:
         """Search for similar documents"""
         top_k = top_k or settings.default_top_k
 
-        # Generate query embedding
-        query_embedding = self.embedding_generator.generate_embedding(query)
+        cache_key = f"{top_k} {query}"
+        results = None
+        if filter_metadata is None:
+            results = self.result_cache.get(cache_key)
+
+        if results is None:
+            # Generate query embedding
+            query_embedding = self.embed_query(query)
+
+            results = self.search_by_vector(query_embedding, top_k, filter_metadata)
+
+            if filter_metadata is None:
+                self.result_cache.add(cache_key, results)
+
+        # Callers annotate results (e.g. rerank_score), so hand out copies
+        return [dict(doc) for doc in results]
+
+    def embed_query(self, query: str) -> List[float]:
+        """Embed a query, reusing the embedding of an identical earlier query"""
+        embedding = self.embedding_cache.get(query)
+        if embedding is None:
+            embedding = self.embedding_generator.generate_embedding(query)
+            self.embedding_cache.add(query, embedding)
+        return embedding
+
+    def search_by_vector(
+        self,
+        query_embedding: List[float],
+        top_k: int = None,
+        filter_metadata: Dict[str, Any] = None
+    ) -> List[Dict[str, Any]]:
+        """Search with an already computed query embedding"""
+        return self.search_by_vectors([query_embedding], top_k, filter_metadata)[0]
+
+    def search_by_vectors(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = None,
+        filter_metadata: Dict[str, Any] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """Search with several already computed query embeddings in one query"""
+        top_k = top_k or settings.default_top_k
+
+        # The knowledge base is small enough to score exactly with one
+        # matrix product; metadata filters still go through ChromaDB
+        if filter_metadata is None and query_embeddings:
+            return self._search_matrix(query_embeddings, top_k)
 
-        # Search
         results = self.collection.query(
-            query_embeddings=[query_embedding],
+            query_embeddings=query_embeddings,
             n_results=top_k,
             where=filter_metadata,
             include=["documents", "metadatas", "distances"]
         )
 
-        # Format results
-        formatted_results = []
-        for i in range(len(results['ids'][0])):
-            formatted_results.append({
-                'id': results['ids'][0][i],
-                'content': results['documents'][0][i],
-                'metadata': results['metadatas'][0][i],
-                'distance': results['distances'][0][i],
-                'score': 1 - results['distances'][0][i]  # Convert distance to similarity score
-            })
+        return [self._format_results(results, q) for q in range(len(query_embeddings))]
 
-        return formatted_results
+    def search_batch(
+        self,
+        queries: List[str],
+        top_k: int = None,
+        filter_metadata: Dict[str, Any] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """Search for several queries with one embedding call and one query"""
+        top_k = top_k or settings.default_top_k
+
+        if not queries:
+            return []
+
+        # Generate the uncached query embeddings in a single request
+        query_embeddings = [self.embedding_cache.get(query) for query in queries]
+        missing = [i for i, embedding in enumerate(query_embeddings) if embedding is None]
+
+        if missing:
+            generated = self.embedding_generator.generate_embeddings([queries[i] for i in missing])
+            for i, embedding in zip(missing, generated):
+                query_embeddings[i] = embedding
+                self.embedding_cache.add(queries[i], embedding)
+
+        return self.search_by_vectors(query_embeddings, top_k, filter_metadata)
+
+    def get_embeddings(self, ids: List[str]) -> np.ndarray:
+        """
+        Get stored embeddings for documents
+
+        Args:
+            ids: Document IDs (must exist in the collection)
+
+        Returns:
+            float32 matrix with one row per id, in id order
+        """
+        matrix = self._load_matrix()
+        return matrix['embeddings'][[matrix['rows'][doc_id] for doc_id in ids]]
+
+    def _load_matrix(self) -> Dict[str, Any]:
+        """Load every id, embedding, document and metadata of the collection"""
+        matrix = self._matrix
+        if matrix is None:
+            data = self.collection.get(include=["embeddings", "documents", "metadatas"])
+            embeddings = np.asarray(data['embeddings'], dtype=np.float32)
+            matrix = {
+                'ids': data['ids'],
+                'rows': {doc_id: i for i, doc_id in enumerate(data['ids'])},
+                'embeddings': embeddings,
+                'sq_norms': np.einsum('ij,ij->i', embeddings, embeddings),
+                'documents': data['documents'],
+                'metadatas': data['metadatas']
+            }
+            self._matrix = matrix
+        return matrix
+
+    def _search_matrix(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int
+    ) -> List[List[Dict[str, Any]]]:
+        """Exact search over the in-memory collection, scored like ChromaDB"""
+        matrix = self._load_matrix()
+        n = len(matrix['ids'])
+
+        if n == 0:
+            return [[] for _ in query_embeddings]
+
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        dots = queries @ matrix['embeddings'].T
+
+        # Same distance as the collection's HNSW space
+        space = (self.collection.metadata or {}).get('hnsw:space', 'l2')
+        if space == 'cosine':
+            norms = np.linalg.norm(queries, axis=1)[:, None] * np.sqrt(matrix['sq_norms'])
+            distances = 1 - dots / np.maximum(norms, 1e-12)
+        elif space == 'ip':
+            distances = 1 - dots
+        else:
+            distances = np.einsum('ij,ij->i', queries, queries)[:, None] + matrix['sq_norms'] - 2 * dots
+
+        k = min(top_k, n)
+        top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        top = np.take_along_axis(top, np.argsort(np.take_along_axis(distances, top, axis=1), axis=1), axis=1)
+
+        return [
+            [
+                {
+                    'id': matrix['ids'][i],
+                    'content': matrix['documents'][i],
+                    'preview': matrix['documents'][i][:settings.preview_chars],
+                    'metadata': matrix['metadatas'][i],
+                    'distance': float(distances[q, i]),
+                    'score': 1 - float(distances[q, i])  # Convert distance to similarity score
+                }
+                for i in top[q]
+            ]
+            for q in range(len(queries))
+        ]
+
+    def _format_results(
+        self,
+        results: Dict[str, Any],
+        q: int
+    ) -> List[Dict[str, Any]]:
+        """Format the results of the q-th query embedding"""
+        return [
+            {
+                'id': results['ids'][q][i],
+                'content': results['documents'][q][i],
+                'preview': results['documents'][q][i][:settings.preview_chars],
+                'metadata': results['metadatas'][q][i],
+                'distance': results['distances'][q][i],
+                'score': 1 - results['distances'][q][i]  # Convert distance to similarity score
+            }
+            for i in range(len(results['ids'][q]))
+        ]
 
     def delete_all(self):
         """Delete all documents from collection"""
         self.client.delete_collection(self.collection_name)
-        self.collection = self.client.get_or_create_collection(
-            name=self.collection_name,
-            metadata={"description": "Customer support knowledge base"}
-        )
+        self.collection = self._open_collection()
+        self._matrix = None
+        self.result_cache.clear()
         print(f"Deleted all documents from {self.collection_name}")
 
     def count(self) -> int:
@@ -121,33 +389,46 @@ class VectorStore:
         return {
             'id': results['ids'][0],
             'content': results['documents'][0],
+            'preview': results['documents'][0][:settings.preview_chars],
             'metadata': results['metadatas'][0]
         }
 
+def content_sha1(content: str) -> str:
+    """Hash document content to detect changes between builds"""
+    return hashlib.sha1(content.encode()).hexdigest()
+
 def build_vector_store(reset: bool = False):
-    """Build vector store from knowledge base"""
+    """
+    Build vector store from knowledge base
+
+    Args:
+        reset: Drop the collection and rebuild it from scratch; otherwise
+            an already populated store is returned as is
+    """
     from src.data_loader import KnowledgeBaseLoader
 
     # Initialize
     vector_store = VectorStore()
 
     # Check if already populated
-    if vector_store.count() > 0 and not reset:
+    if reset:
+        vector_store.delete_all()
+    elif vector_store.count() > 0:
         print(f"Vector store already contains {vector_store.count()} documents")
         print("Use reset=True to rebuild")
         return vector_store
 
-    # Reset if requested
-    if reset:
-        print("Resetting vector store...")
-        vector_store.delete_all()
-
     # Load documents
     loader = KnowledgeBaseLoader()
     documents = loader.load_all()
 
-    # Add to vector store
-    vector_store.add_documents(documents)
+    # Sync with the knowledge base, embedding only new or changed documents
+    print("Syncing vector store with knowledge base...")
+    changes = vector_store.sync_documents(documents)
+    print(
+        f"Added {changes['added']}, updated {changes['updated']}, "
+        f"removed {changes['removed']}, unchanged {changes['unchanged']}"
+    )
 
     print(f"\nVector store built successfully!")
     print(f"Total documents: {vector_store.count()}")
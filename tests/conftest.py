@@ -0,0 +1,7 @@
+"""
+Shared test setup
+"""
+import os
+
+# Settings require an API key at import; tests never call the API
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
@@ -0,0 +1,45 @@
+"""
+Tests for Agentic RAG plan scheduling
+"""
+from src.rag.agentic_rag import AgenticRAG
+
+def schedule(plan):
+    # schedule_plan only looks at the plan
+    waves = AgenticRAG.__new__(AgenticRAG).schedule_plan(plan)
+    return [[i for i, _ in wave] for wave in waves]
+
+def test_leading_retrievals_run_together():
+    plan = [
+        {"step": 1, "action": "retrieve"},
+        {"step": 2, "action": "retrieve"},
+        {"step": 3, "action": "grade"},
+        {"step": 4, "action": "compare"},
+    ]
+    assert schedule(plan) == [[1, 2], [3], [4]]
+
+def test_steps_after_a_non_retrieval_are_sequential():
+    plan = [
+        {"step": 1, "action": "retrieve"},
+        {"step": 2, "action": "grade"},
+        {"step": 3, "action": "retrieve"},
+    ]
+    assert schedule(plan) == [[1], [2], [3]]
+
+def test_depends_on_groups_independent_steps():
+    plan = [
+        {"step": 1, "action": "retrieve"},
+        {"step": 2, "action": "grade", "depends_on": [1]},
+        {"step": 3, "action": "retrieve", "depends_on": []},
+        {"step": 4, "action": "synthesize", "depends_on": [2, 3]},
+    ]
+    assert schedule(plan) == [[1, 3], [2], [4]]
+
+def test_forward_and_unknown_dependencies_are_ignored():
+    plan = [
+        {"step": 1, "action": "retrieve", "depends_on": [2]},
+        {"step": 2, "action": "generate", "depends_on": [1, 9]},
+    ]
+    assert schedule(plan) == [[1], [2]]
+
+def test_empty_plan():
+    assert schedule([]) == []
@@ -0,0 +1,45 @@
+"""
+Tests for the streamed JSON field scanner
+"""
+import orjson
+from src.agents.base_agent import JSONFieldScanner
+
+ROUTE = {
+    "category": "policy",
+    "requires_retrieval": True,
+    "search_queries": ["return {electronics}", "refund, \"defective\" items"],
+    "details": {"nested": [1, {"deep": "}"}], "flag": False},
+    "confidence": 0.9
+}
+
+def scan(chunks):
+    fields = []
+    scanner = JSONFieldScanner(lambda key, value: fields.append((key, value)))
+    for chunk in chunks:
+        scanner.feed(chunk)
+    return fields
+
+def test_reports_every_top_level_field_in_order():
+    text = orjson.dumps(ROUTE).decode()
+    assert scan([text]) == list(ROUTE.items())
+
+def test_chunk_boundaries_do_not_matter():
+    text = orjson.dumps(ROUTE, option=orjson.OPT_INDENT_2).decode()
+    assert scan(list(text)) == list(ROUTE.items())
+    assert scan([text[i:i + 7] for i in range(0, len(text), 7)]) == list(ROUTE.items())
+
+def test_field_reported_as_soon_as_it_completes():
+    fields = []
+    scanner = JSONFieldScanner(lambda key, value: fields.append(key))
+
+    scanner.feed('{"requires_retrieval": false')
+    assert fields == []
+
+    scanner.feed(', "category": "gen')
+    assert fields == ["requires_retrieval"]
+
+def test_text_before_the_object_is_ignored():
+    assert scan(['```json\n{"a": 1}\n```']) == [("a", 1)]
+
+def test_malformed_member_is_skipped():
+    assert scan(['{"a": tru, "b": 2}']) == [("b", 2)]
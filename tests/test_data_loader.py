@@ -0,0 +1,71 @@
+"""
+Tests that render_fields matches the original document text templates
+"""
+import pytest
+from src.config import settings
+from src.data_loader import (
+    FAQ_FIELDS,
+    POLICY_FIELDS,
+    PRODUCT_FIELDS,
+    SHIPPING_FIELDS,
+    KnowledgeBaseLoader,
+    render_fields
+)
+
+def product_template(product):
+    return f"""
+Product: {product['name']}
+Category: {product['category']}
+Price: ${product['price']}
+Description: {product['description']}
+Specifications: {product.get('specifications', 'N/A')}
+Warranty: {product.get('warranty', 'No warranty')}
+Return Period: {product.get('return_period', 'Standard return policy applies')}
+    """.strip()
+
+def policy_template(policy):
+    return f"""
+Policy: {policy['title']}
+Category: {policy['category']}
+Details: {policy['content']}
+    """.strip()
+
+def shipping_template(doc):
+    return f"""
+Shipping Information: {doc['title']}
+Category: {doc['category']}
+Details: {doc['content']}
+    """.strip()
+
+def faq_template(faq):
+    return f"""
+Question: {faq['question']}
+Category: {faq['category']}
+Answer: {faq['answer']}
+    """.strip()
+
+@pytest.mark.parametrize("file_name, fields, template", [
+    ("products.json", PRODUCT_FIELDS, product_template),
+    ("policies.json", POLICY_FIELDS, policy_template),
+    ("shipping.json", SHIPPING_FIELDS, shipping_template),
+    ("faq.json", FAQ_FIELDS, faq_template),
+])
+def test_knowledge_base_renders_like_the_templates(file_name, fields, template):
+    records = KnowledgeBaseLoader().load_json_file(settings.knowledge_base_dir / file_name)
+
+    assert records
+    for record in records:
+        assert render_fields(record, fields) == template(record)
+
+def test_optional_fields_fall_back_to_defaults():
+    product = {
+        "name": "Cable",
+        "category": "Accessories",
+        "price": 9.99,
+        "description": "USB-C cable"
+    }
+    assert render_fields(product, PRODUCT_FIELDS) == product_template(product)
+
+def test_missing_required_field_raises():
+    with pytest.raises(KeyError):
+        render_fields({"title": "Returns", "category": "returns"}, POLICY_FIELDS)
@@ -0,0 +1,47 @@
+"""
+Tests for the grading cache
+"""
+from src.agents.grading_agent import GradingAgent
+
+class CountingReranker:
+    """Scores every document as irrelevant, so no key points are extracted"""
+
+    def __init__(self):
+        self.scored = []
+
+    def score(self, query, documents):
+        self.scored.extend(doc['id'] for doc in documents)
+        return [0.1 for _ in documents]
+
+def agent_and_reranker():
+    reranker = CountingReranker()
+    return GradingAgent(reranker, client=object()), reranker
+
+def test_repeat_documents_are_not_regraded():
+    agent, reranker = agent_and_reranker()
+    documents = [{"id": "A", "content": "alpha"}, {"id": "B", "content": "beta"}]
+
+    agent.grade_documents_batch("query", documents)
+    agent.grade_documents_batch("query", documents + [{"id": "C", "content": "gamma"}])
+
+    assert reranker.scored == ["A", "B", "C"]
+
+def test_changed_content_is_regraded():
+    agent, reranker = agent_and_reranker()
+
+    agent.grade_document("query", {"id": "A", "content": "old text"})
+    agent.grade_document("query", {"id": "A", "content": "new text"})
+
+    assert reranker.scored == ["A", "A"]
+
+def test_cached_gradings_are_returned_as_copies():
+    agent, _ = agent_and_reranker()
+    document = {"id": "A", "content": "alpha"}
+
+    first = agent.grade_document("query", document)
+    first['key_points'].append("edited")
+    first['is_relevant'] = True
+
+    second = agent.grade_document("query", document)
+    assert second['key_points'] == []
+    assert second['is_relevant'] is False
@@ -0,0 +1,71 @@
+"""
+Tests for MMR reranking and near-duplicate removal
+"""
+import numpy as np
+from src.reranker import DocumentReranker, drop_near_duplicates, mmr_select, simhash64
+
+def scored(*scores):
+    return [
+        {"id": f"D{i}", "content": f"document {i}", "rerank_score": score}
+        for i, score in enumerate(scores)
+    ]
+
+def test_mmr_select_with_full_relevance_weight_is_plain_ranking():
+    relevance = np.array([0.2, 0.9, 0.5], dtype=np.float32)
+    similarity = np.ones((3, 3), dtype=np.float32)
+    assert mmr_select(relevance, similarity, k=3, lambda_=1.0) == [1, 2, 0]
+
+def test_mmr_select_skips_near_duplicates():
+    relevance = np.array([1.0, 0.95, 0.6], dtype=np.float32)
+    similarity = np.array([
+        [1.0, 0.99, 0.0],
+        [0.99, 1.0, 0.0],
+        [0.0, 0.0, 1.0],
+    ], dtype=np.float32)
+    assert mmr_select(relevance, similarity, k=2, lambda_=0.5) == [0, 2]
+
+def test_mmr_select_k_larger_than_candidates():
+    relevance = np.array([0.1, 0.2], dtype=np.float32)
+    assert sorted(mmr_select(relevance, np.eye(2, dtype=np.float32), k=5)) == [0, 1]
+
+def test_rerank_mmr_diversifies_and_keeps_scores():
+    # reuse_scores keeps the cross-encoder out of the test
+    reranker = DocumentReranker.__new__(DocumentReranker)
+    documents = scored(5.0, 4.9, 1.0)
+    embeddings = np.array([[1, 0], [1, 0.01], [0, 1]], dtype=np.float32)
+
+    reranked = reranker.rerank_mmr(
+        "query", documents, embeddings, top_k=2, lambda_=0.5, reuse_scores=True
+    )
+
+    assert [doc["id"] for doc in reranked] == ["D0", "D2"]
+    assert [doc["rerank_score"] for doc in reranked] == [5.0, 1.0]
+    assert reranked[0] is not documents[0]
+
+def test_rerank_mmr_without_documents():
+    reranker = DocumentReranker.__new__(DocumentReranker)
+    assert reranker.rerank_mmr("query", [], np.empty((0, 2)), top_k=3) == []
+
+def test_simhash_is_close_for_near_duplicates():
+    text = "items can be returned within thirty days of delivery in their original condition with a receipt"
+    near = text.replace("receipt", "receipt.")
+    other = "standard shipping takes five to seven business days within the continental united states"
+
+    assert (simhash64(text) ^ simhash64(near)).bit_count() < (simhash64(text) ^ simhash64(other)).bit_count()
+
+def test_drop_near_duplicates_keeps_first_occurrence():
+    text = "Return Policy: Items can be returned within 30 days of delivery in original condition."
+    documents = [
+        {"id": "best", "content": text},
+        {"id": "copy", "content": text.upper()},
+        {"id": "other", "content": "Shipping: Orders ship within two business days from our warehouse."},
+    ]
+
+    assert [doc["id"] for doc in drop_near_duplicates(documents)] == ["best", "other"]
+
+def test_drop_near_duplicates_max_distance_zero_keeps_distinct_texts():
+    documents = [
+        {"id": "a", "content": "alpha beta gamma delta"},
+        {"id": "b", "content": "epsilon zeta eta theta"},
+    ]
+    assert drop_near_duplicates(documents, max_distance=0) == documents
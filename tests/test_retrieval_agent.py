@@ -0,0 +1,66 @@
+"""
+Tests for retrieval depth by route complexity
+"""
+from src.agents.base_agent import AgentContext
+from src.agents.planning_agent import PlanningAgent
+from src.agents.retrieval_agent import RetrievalAgent
+
+class RecordingStore:
+    """Vector store stand-in that records each search's top_k"""
+
+    def __init__(self):
+        self.top_ks = []
+
+    def search_batch(self, queries, top_k):
+        self.top_ks.append(top_k)
+        return [[] for _ in queries]
+
+def retrieval_agent(store):
+    # No step here calls the LLM, and empty results are never reranked
+    return RetrievalAgent(store, reranker=object(), client=object())
+
+def planned_retrieve_step(route_info):
+    context = AgentContext(query="What is RAG?", route_info=route_info)
+    PlanningAgent(client=object()).execute(context)
+    return context, context.plan[0]
+
+def test_simple_route_searches_with_simple_top_k():
+    store = RecordingStore()
+    context, step = planned_retrieve_step({"complexity": "simple"})
+
+    retrieval_agent(store).execute(context, step)
+
+    assert store.top_ks == [3]
+
+def test_direct_medium_route_searches_with_medium_top_k():
+    store = RecordingStore()
+    context, step = planned_retrieve_step(
+        {"complexity": "medium", "suggested_strategy": "direct"}
+    )
+
+    retrieval_agent(store).retrieve(context, step)
+
+    assert store.top_ks == [8]
+
+def test_step_top_k_is_capped_by_complexity():
+    store = RecordingStore()
+    agent = retrieval_agent(store)
+    context = AgentContext(query="What is RAG?", route_info={"complexity": "simple"})
+
+    agent.retrieve(context, {"action": "retrieve", "params": {"top_k": 20}})
+    agent.retrieve(context, {"action": "retrieve", "params": {"top_k": 2}})
+
+    assert store.top_ks == [3, 2]
+
+def test_repeated_step_rankings_are_fused_once():
+    store = RecordingStore()
+    agent = retrieval_agent(store)
+    context = AgentContext(query="What is RAG?", route_info={"complexity": "simple"})
+    first = (["returns"], [{"id": "A"}, {"id": "B"}])
+    second = (["refunds"], [{"id": "B"}, {"id": "C"}])
+
+    agent.merge(context, [first, second])
+    agent.merge(context, [first])
+
+    assert list(context.metadata['retrieval_history']) == [("returns",), ("refunds",)]
+    assert [doc["id"] for doc in context.retrieved_docs] == ["B", "A", "C"]
@@ -0,0 +1,44 @@
+"""
+Tests for Self-RAG independent grading
+"""
+import asyncio
+from types import SimpleNamespace
+import orjson
+from src.rag.self_rag import SelfRAG
+
+class GradingClient:
+    """Chat client stand-in that marks documents mentioning returns relevant"""
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, messages, **kwargs):
+        relevant = "returns" in messages[0]["content"].split("Document:")[-1]
+        content = orjson.dumps({"is_relevant": relevant, "relevance_score": float(relevant)})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+def self_rag(client):
+    return SelfRAG(
+        SimpleNamespace(embedding_generator=object()),
+        reranker=object(),
+        independent_grading=True,
+        client=client
+    )
+
+DOCUMENTS = [
+    {"id": "POL001", "content": "Unworn items: returns are accepted within 30 days."},
+    {"id": "SHIP001", "content": "Standard shipping takes five to seven business days."},
+]
+
+def test_independent_grading_keeps_relevant_documents():
+    rag = self_rag(GradingClient())
+    relevant = rag.grade_documents("What is the policy?", [dict(doc) for doc in DOCUMENTS])
+    assert [doc["id"] for doc in relevant] == ["POL001"]
+
+def test_independent_grading_works_inside_a_running_event_loop():
+    rag = self_rag(GradingClient())
+
+    async def grade():
+        return rag.grade_documents("What is the policy?", [dict(doc) for doc in DOCUMENTS])
+
+    assert [doc["id"] for doc in asyncio.run(grade())] == ["POL001"]
@@ -0,0 +1,74 @@
+"""
+Tests for the query and semantic caches
+"""
+import numpy as np
+from src import semantic_cache
+from src.semantic_cache import QueryCache, SemanticCache, copy_result
+
+def unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+def test_query_cache_normalizes_case_and_whitespace():
+    cache = QueryCache()
+    cache.add("What is  your Return policy?", "answer")
+    assert cache.get("  what is your return POLICY? ") == "answer"
+    assert cache.get("what is your refund policy?") is None
+
+def test_query_cache_evicts_least_recently_used():
+    cache = QueryCache(max_size=2)
+    cache.add("a", 1)
+    cache.add("b", 2)
+    cache.get("a")
+    cache.add("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+def test_query_cache_clear():
+    cache = QueryCache()
+    cache.add("a", 1)
+    cache.clear()
+    assert cache.get("a") is None
+
+def test_semantic_cache_hits_only_above_threshold():
+    cache = SemanticCache(embedder=object(), threshold=0.95)
+    cache.add(unit(1, 0), "stored")
+
+    assert cache.get(unit(1, 0.1)) == "stored"
+    assert cache.get(unit(1, 1)) is None
+
+def test_semantic_cache_evicts_least_recently_used():
+    cache = SemanticCache(embedder=object(), threshold=0.99, max_size=2)
+    cache.add(unit(1, 0, 0), "x")
+    cache.add(unit(0, 1, 0), "y")
+    cache.get(unit(1, 0, 0))
+    cache.add(unit(0, 0, 1), "z")
+
+    assert cache.get(unit(0, 1, 0)) is None
+    assert cache.get(unit(1, 0, 0)) == "x"
+    assert cache.get(unit(0, 0, 1)) == "z"
+
+def test_semantic_cache_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(semantic_cache.time, "time", lambda: now[0])
+
+    cache = SemanticCache(embedder=object(), threshold=0.95, ttl=60)
+    cache.add(unit(1, 0), "stored")
+
+    now[0] += 59
+    assert cache.get(unit(1, 0)) == "stored"
+
+    now[0] += 2
+    assert cache.get(unit(1, 0)) is None
+
+def test_copy_result_copies_sources_and_trace():
+    result = {"answer": "a", "sources": [{"id": "D1"}], "trace": [{"step": "x"}]}
+    copy = copy_result(result)
+
+    copy["sources"][0]["grading"] = {}
+    copy["sources"].append({"id": "D2"})
+    copy["trace"].append({"step": "y"})
+
+    assert result == {"answer": "a", "sources": [{"id": "D1"}], "trace": [{"step": "x"}]}
@@ -0,0 +1,69 @@
+"""
+Tests for matching batched validation verdicts to answers
+"""
+from types import SimpleNamespace
+import orjson
+from src.agents.base_agent import AgentContext
+from src.agents.validation_agent import ValidationAgent
+
+class ScriptedClient:
+    """Chat client stand-in that returns one canned response"""
+
+    def __init__(self, response):
+        content = orjson.dumps(response).decode()
+        message = SimpleNamespace(message=SimpleNamespace(content=content))
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        self.response = SimpleNamespace(choices=[message])
+
+    def create(self, **kwargs):
+        self.calls += 1
+        return self.response
+
+def validate(answers, validations):
+    agent = ValidationAgent(client=ScriptedClient({"validations": validations}))
+    context = AgentContext(query="What is your return policy?")
+    return agent.execute_batch(context, answers)
+
+def verdict(quality, **extra):
+    return {"overall_quality": quality, "is_valid": quality != "poor", **extra}
+
+def test_verdicts_are_matched_by_index():
+    results = validate(
+        ["first", "second"],
+        [verdict("good", index=1), verdict("poor", index=0)]
+    )
+    assert [r["overall_quality"] for r in results] == ["poor", "good"]
+
+def test_single_verdict_without_index_is_matched_by_position():
+    assert validate(["only"], [verdict("excellent")])[0]["overall_quality"] == "excellent"
+
+def test_renumbered_verdicts_are_matched_by_position():
+    results = validate(
+        ["first", "second"],
+        [verdict("good", index=1), verdict("poor", index=2)]
+    )
+    assert [r["overall_quality"] for r in results] == ["good", "poor"]
+
+def test_missing_verdicts_and_answers_are_poor():
+    results = validate(["first", "second", ""], [verdict("good", index=0)])
+
+    assert results[0]["overall_quality"] == "good"
+    assert results[1]["overall_quality"] == "poor"
+    assert results[1]["is_valid"] is False
+    assert results[2]["overall_quality"] == "poor"
+    assert results[2]["is_valid"] is False
+
+def test_verdicts_are_cached_per_answer_and_sources():
+    client = ScriptedClient({"validations": [verdict("good", index=0)]})
+    agent = ValidationAgent(client=client)
+    context = AgentContext(query="What is your return policy?")
+    context.graded_docs = [{"id": "POL001", "content": "30 day returns"}]
+
+    agent.execute_batch(context, ["answer"])
+    agent.execute_batch(context, ["answer"])
+    assert client.calls == 1
+
+    context.graded_docs = [{"id": "POL001", "content": "60 day returns"}]
+    agent.execute_batch(context, ["answer"])
+    assert client.calls == 2
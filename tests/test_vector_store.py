@@ -0,0 +1,63 @@
+"""
+Tests that batched searches keep results aligned with their queries
+"""
+from types import SimpleNamespace
+import pytest
+from src.embeddings import EmbeddingGenerator
+from src.vector_store import VectorStore
+
+TOPICS = ["returns", "shipping", "warranty", "payments"]
+
+class TopicEmbeddings(EmbeddingGenerator):
+    """Embeds a text as a one-hot vector of the topic it mentions"""
+
+    def __init__(self):
+        self.model = "topic"
+        self.requests = []
+
+    def _create_embeddings(self, input):
+        texts = [input] if isinstance(input, str) else input
+        self.requests.append(texts)
+        return SimpleNamespace(data=[
+            SimpleNamespace(embedding=[float(topic in text) for topic in TOPICS])
+            for text in texts
+        ])
+
+@pytest.fixture
+def store(tmp_path):
+    embeddings = TopicEmbeddings()
+    store = VectorStore(
+        collection_name="test_kb",
+        persist_directory=str(tmp_path),
+        embedding_generator=embeddings
+    )
+    store.collection.add(
+        ids=TOPICS,
+        documents=[f"All about {topic}" for topic in TOPICS],
+        embeddings=embeddings.generate_embeddings(TOPICS)
+    )
+    return store
+
+def test_search_batch_results_follow_query_order(store):
+    queries = ["payments accepted", "shipping times", "returns window", "warranty claims"]
+    results = store.search_batch(queries, top_k=1)
+    assert [docs[0]["id"] for docs in results] == ["payments", "shipping", "returns", "warranty"]
+
+def test_search_batch_mixes_cached_and_new_queries(store):
+    store.embed_query("shipping times")
+    store.embed_query("warranty claims")
+    store.embedding_generator.requests.clear()
+
+    queries = ["returns window", "shipping times", "payments accepted", "warranty claims"]
+    results = store.search_batch(queries, top_k=1)
+
+    assert store.embedding_generator.requests == [["returns window", "payments accepted"]]
+    assert [docs[0]["id"] for docs in results] == ["returns", "shipping", "payments", "warranty"]
+
+def test_search_batch_rejects_empty_query(store):
+    with pytest.raises(ValueError):
+        store.search_batch(["returns window", "  ", "shipping times"], top_k=1)
+
+def test_generate_embeddings_returns_one_per_text():
+    embeddings = TopicEmbeddings().generate_embeddings(["shipping\ncosts", "returns"])
+    assert embeddings == [[0.0, 1.0, 0.0, 0.0], [1.0, 0.0, 0.0, 0.0]]